@@ -0,0 +1,154 @@
+"""Admission control: which queued job may start right now.
+
+A job is held back while its estimated output, plus what the running jobs
+are still expected to write, would eat into a free-space reserve on the
+output volume. A job that can't fit even with nothing else running fails
+instead of filling the disk. Separately, the number of jobs reading from
+the same source device can be capped so parallel encodes don't thrash one
+disk (or NAS share) with seeks.
+"""
+import collections
+import os
+import shutil
+import subprocess
+import threading
+import time
+import weakref
+from dataclasses import replace
+
+from engine import clip_duration, parse_bitrate
+from journal import output_size, partial_path
+from ladder import parse_renditions
+from remux import frame_rate
+
+DEFAULT_RESERVE_MB = 256
+# Estimates are rough; leave room for outputs coming out larger
+SIZE_MARGIN = 1.25
+# CRF mode has no bitrate to go on; bits per pixel per frame to assume
+CRF_BPP = 0.1
+DEFAULT_FPS = 30.0
+# How long a free-space reading is reused while jobs wait for admission
+USAGE_TTL = 1.0
+
+
+def estimate_output_bytes(path, settings, info):
+    """Rough size of the output for ``path``, from its probed ``info`` (or None)."""
+    if settings.renditions:
+        # Each rendition as if it were encoded on its own
+        return sum(estimate_output_bytes(path, replace(
+            settings, renditions="", resolution=f"{r.width}x{r.height}", target_size=0,
+            video_bitrate=r.bitrate or settings.video_bitrate), info)
+            for r in parse_renditions(settings.renditions))
+    input_size = output_size(path)
+    duration = clip_duration(info.duration, settings) if info else 0
+    if settings.target_size > 0:
+        return int(settings.target_size * 1024 * 1024)
+    if duration <= 0:
+        return input_size
+    audio = parse_bitrate(settings.audio_bitrate) if info and info.stream("audio") else 0
+    if settings.video_bitrate > 0:
+        return int((settings.video_bitrate * 1000 + audio) * duration / 8)
+    try:
+        w, h = map(int, settings.resolution.lower().split("x"))
+    except ValueError:
+        return input_size
+    video = info.stream("video")
+    fps = (frame_rate(video) if video else 0) or DEFAULT_FPS
+    # Re-encodes are almost never bigger than their source
+    return min(int((w * h * fps * CRF_BPP + audio) * duration / 8), input_size)
+
+
+class Admission:
+    """Decides whether a job may start, reserving space for it if so.
+
+    ``prepare(job)`` sizes a job up when it is queued, so that ``admit
+    (job)``, a JobScheduler admission hook run under the scheduler's lock,
+    is only bookkeeping. ``release(job)`` is called once the job has
+    finished.
+    """
+
+    def __init__(self, outdir, probe_cache, reserve_mb=DEFAULT_RESERVE_MB, per_device=0):
+        self.outdir = outdir
+        self.probe_cache = probe_cache
+        self.reserve = reserve_mb * 1024 * 1024
+        # Concurrent jobs per source device, 0 for no limit
+        self.per_device = per_device
+        self._lock = threading.Lock()
+        # Queued job -> (estimated bytes, source device, partial output), or
+        # None for a job that will write nothing
+        self._plans = weakref.WeakKeyDictionary()
+        # Running job -> (estimated bytes, partial output being written)
+        self._reserved = {}
+        self._job_device = {}
+        self._devices = collections.Counter()
+        # (time, free bytes, {running job: bytes written}) from the last look
+        self._usage = None
+
+    def estimate(self, job):
+        try:
+            info = self.probe_cache.get(job.key)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            info = None
+        return int(estimate_output_bytes(job.key, job.data, info) * SIZE_MARGIN)
+
+    def prepare(self, job, skip=False):
+        """Estimates ``job``'s output, probing it if needed. ``skip`` marks
+        a job that will write nothing (its output is up to date)."""
+        plan = None
+        if not skip:
+            try:
+                device = os.stat(job.key).st_dev
+            except OSError:
+                device = None  # the encode will report the missing file
+            part = partial_path(job.output)
+            plan = (self.estimate(job), device, part)
+        with self._lock:
+            self._plans[job] = plan
+
+    def _disk_usage(self):
+        """Free space and the running jobs' bytes written, re-read at most
+        every USAGE_TTL seconds."""
+        now = time.monotonic()
+        if self._usage is None or now - self._usage[0] >= USAGE_TTL:
+            written = {job: output_size(part) for job, (_, part) in self._reserved.items()}
+            self._usage = (now, shutil.disk_usage(self.outdir).free, written)
+        return self._usage[1], self._usage[2]
+
+    def admit(self, job):
+        """True to start ``job`` now, False to hold it back.
+
+        Raises RuntimeError if the job can never fit in the free space.
+        """
+        if job not in self._plans:
+            self.prepare(job)
+        with self._lock:
+            plan = self._plans[job]
+            if plan is None:
+                return True
+            need, device, part = plan
+            if self.per_device and self._devices[device] >= self.per_device:
+                return False
+            free, written = self._disk_usage()
+            # Running jobs' partial outputs already take up part of their estimate
+            pending = sum(max(est - written.get(j, 0), 0)
+                          for j, (est, _) in self._reserved.items())
+            if free - pending - need < self.reserve:
+                if not self._reserved:
+                    raise RuntimeError(
+                        f"not enough free space in {self.outdir}: output needs about "
+                        f"{need / 2**20:.0f} MB, {free / 2**20:.0f} MB free with a "
+                        f"{self.reserve / 2**20:.0f} MB reserve")
+                return False
+            self._reserved[job] = (need, part)
+            self._job_device[job] = device
+            self._devices[device] += 1
+            return True
+
+    def release(self, job):
+        with self._lock:
+            self._plans.pop(job, None)
+            self._reserved.pop(job, None)
+            if job in self._job_device:
+                self._devices[self._job_device.pop(job)] -= 1
+            # The finished output has taken its space for real now
+            self._usage = None
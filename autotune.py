@@ -0,0 +1,172 @@
+"""Per-file CRF search against a quality target on short sampled segments.
+
+A handful of short segments spread over the clip are encoded at candidate
+CRFs (in parallel) and scored against the source with SSIM/VMAF/PSNR. A
+binary search finds the highest CRF, i.e. the smallest output, whose worst
+sample still meets the target. Results are cached per file, keyed like the
+probe cache, so re-running a batch doesn't search again.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+from engine import build_command, clip_duration, clip_range, run_ffmpeg
+from probe import cache_dir
+from progress import EventBus
+from quality import available_metrics, measure
+from scheduler import cpu_count
+
+CRF_MIN = 18
+CRF_MAX = 40
+SAMPLES = 3
+SAMPLE_LENGTH = 4.0
+
+
+def sample_ranges(start, length, count=SAMPLES, sample_length=SAMPLE_LENGTH):
+    """``(offset, length)`` of ``count`` samples spread evenly over a clip."""
+    if length <= count * sample_length:
+        return [(start, length)]
+    step = length / count
+    return [(start + step * (i + 0.5) - sample_length / 2, sample_length)
+            for i in range(count)]
+
+
+class AutoTuner:
+    def __init__(self, path=None, samples=SAMPLES, sample_length=SAMPLE_LENGTH):
+        self.samples = samples
+        self.sample_length = sample_length
+        if path is None:
+            path = cache_dir() / "autotune.sqlite3"
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+        except (OSError, sqlite3.Error):
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        # Whether this ffmpeg can compute VMAF, checked on first use
+        self._has_vmaf = None
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS autotune ("
+                "path TEXT, size INTEGER, mtime_ns INTEGER, params TEXT, "
+                "crf INTEGER, score REAL, PRIMARY KEY (path, params))")
+
+    def _params(self, settings):
+        # Everything that changes which CRF comes out of the search
+        key = [settings.codec, settings.preset, settings.resolution,
+               settings.trim_start, settings.trim_end, settings.quality_metric,
+               settings.quality_target, self.samples, self.sample_length]
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()[:16]
+
+    def _cached(self, path, params):
+        st = os.stat(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, crf, score FROM autotune WHERE path = ? AND params = ?",
+                (path, params)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2], row[3]
+        return None
+
+    def _store(self, path, params, crf, score):
+        st = os.stat(path)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO autotune VALUES (?, ?, ?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, params, crf, score))
+
+    def tune(self, path, settings, duration, job):
+        """Best ``(crf, score)`` for ``path`` under ``settings``' quality target.
+
+        ``duration`` is the probed length of the input. Samples are encoded
+        as part of ``job``, so they pause and cancel with it and share its
+        CPU budget (``job.threads``, 0 for the whole machine).
+        Returns None if cancelled. If even CRF_MIN misses the target,
+        CRF_MIN is returned with its score. Raises RuntimeError if the
+        metric can't be computed.
+        """
+        path = os.path.abspath(path)
+        metric = settings.quality_metric
+        params = self._params(settings)
+        cached = self._cached(path, params)
+        if cached:
+            return cached
+        if metric == "vmaf":
+            if self._has_vmaf is None:
+                self._has_vmaf = "vmaf" in available_metrics()
+            if not self._has_vmaf:
+                raise RuntimeError("this ffmpeg can't compute VMAF (it needs libvmaf)")
+        start, _ = clip_range(settings)
+        ranges = sample_ranges(start, clip_duration(duration, settings),
+                               self.samples, self.sample_length)
+        budget = job.threads or cpu_count()
+        # Fewer samples at a time than threads, so the budget holds
+        parallel = max(1, min(len(ranges), budget))
+        threads = max(1, budget // parallel)
+        scores = {}
+
+        with tempfile.TemporaryDirectory(prefix="vc_tune_") as tmp, \
+                ThreadPoolExecutor(max_workers=parallel) as pool:
+            def sample_score(crf, i):
+                offset, length = ranges[i]
+                out = Path(tmp) / f"s{i}_crf{crf}.mp4"
+                trial = replace(settings, crf=crf, video_bitrate=0, target_size=0,
+                                trim_start=f"{offset:.3f}", trim_end=f"{offset + length:.3f}")
+                # Sample progress isn't the job's progress, so it goes nowhere
+                if not run_ffmpeg(build_command(path, out, trial, threads, audio=False),
+                                  job, EventBus()):
+                    return None
+                try:
+                    result = measure(out, path, [metric], settings.resolution,
+                                     ref_args=["-ss", f"{offset:.3f}", "-t", f"{length:.3f}"],
+                                     threads=threads)
+                finally:
+                    out.unlink(missing_ok=True)
+                if metric not in result:
+                    raise RuntimeError(f"ffmpeg reported no {metric} score")
+                return result[metric]
+
+            def score(crf):
+                if crf not in scores:
+                    results = list(pool.map(lambda i: sample_score(crf, i), range(len(ranges))))
+                    if None in results:
+                        return None  # cancelled
+                    # The worst sample decides, so no part of the file falls short
+                    scores[crf] = min(results)
+                return scores[crf]
+
+            lo, hi = CRF_MIN, CRF_MAX
+            best = None
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                s = score(mid)
+                if s is None:
+                    return None
+                if s >= settings.quality_target:
+                    best = mid
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+            if best is None:
+                best = CRF_MIN
+            result = (best, score(best))
+        self._store(path, params, *result)
+        return result
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_tuner():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AutoTuner()
+        return _default
@@ -0,0 +1,113 @@
+"""Encoder benchmark over a matrix of codec, preset, rate and resolution.
+
+Each combination is encoded once per sample clip and timed: wall time,
+encode fps, CPU time and peak RSS of the ffmpeg child, output size and
+optionally SSIM/PSNR/VMAF against the source. Runs are sequential so the
+numbers aren't skewed by each other. Without sample clips a lossless
+synthetic clip is generated from ffmpeg's lavfi test sources.
+"""
+import csv
+import itertools
+import json
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from engine import EncodeSettings, build_command, run_ffmpeg
+from progress import EventBus
+from quality import available_metrics, measure
+from scheduler import Job
+
+FIELDS = [
+    "clip", "codec", "preset", "crf", "video_bitrate", "resolution",
+    "wall_s", "cpu_s", "peak_rss_mb", "frames", "encode_fps", "output_bytes",
+    "ssim", "psnr", "vmaf", "error",
+]
+
+
+def make_test_clip(path, duration=10, size="1920x1080", rate=30):
+    """Lossless clip of a moving test pattern with a tone."""
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error", "-nostdin",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={rate}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-c:v", "ffv1", "-c:a", "pcm_s16le", str(path)
+    ], check=True)
+    return Path(path)
+
+
+def matrix(codecs, presets, crfs=(), bitrates=(), resolutions=("640x360",)):
+    """EncodeSettings for every combination; each rate is a CRF or a kbit/s bitrate."""
+    rates = [(c, 0) for c in crfs] + [(EncodeSettings().crf, b) for b in bitrates]
+    for codec, preset, (crf, bitrate), res in itertools.product(
+            codecs, presets, rates, resolutions):
+        yield EncodeSettings(resolution=res, codec=codec, preset=preset,
+                             crf=crf, video_bitrate=bitrate)
+
+
+def run_one(clip, settings, out, metrics=()):
+    """Encodes ``clip`` to ``out`` with ``settings`` and returns a result row."""
+    row = {"clip": Path(clip).name, "codec": settings.codec, "preset": settings.preset,
+           "crf": settings.crf if not settings.video_bitrate else "",
+           "video_bitrate": settings.video_bitrate or "", "resolution": settings.resolution}
+    job = Job(Path(clip), data=settings)
+    bus = EventBus()
+    last = {}
+    bus.subscribe(lambda ev: last.update(event=ev))
+    t0 = time.perf_counter()
+    try:
+        run_ffmpeg(build_command(clip, out, settings), job, bus)
+        wall = time.perf_counter() - t0
+        frames = last["event"].frame if last else 0
+        row.update(wall_s=round(wall, 3), frames=frames,
+                   encode_fps=round(frames / wall, 2) if wall > 0 else "",
+                   output_bytes=Path(out).stat().st_size)
+        if job.cpu_time:
+            row["cpu_s"] = round(job.cpu_time, 3)
+        if job.peak_rss:
+            row["peak_rss_mb"] = round(job.peak_rss / 2**20, 1)
+        if metrics:
+            scores = measure(out, clip, metrics, size=settings.resolution)
+            row.update({k: round(v, 4) for k, v in scores.items()})
+    except (OSError, RuntimeError) as e:
+        row["error"] = str(e)
+    finally:
+        Path(out).unlink(missing_ok=True)
+    return row
+
+
+def run_benchmark(settings_list, clips=(), metrics=(), report=None,
+                  clip_duration=10, on_result=None):
+    """Runs every settings combination over every clip.
+
+    Metrics the local ffmpeg can't compute are dropped. ``on_result(row)``
+    is called after each run; with ``report`` the rows are also written out
+    (see write_report). Returns the list of rows.
+    """
+    settings_list = list(settings_list)
+    metrics = [m for m in metrics if m in available_metrics()]
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="vc_bench_") as tmp:
+        tmp = Path(tmp)
+        clips = list(clips) or [make_test_clip(tmp / "testsrc.mkv", clip_duration)]
+        for n, (clip, settings) in enumerate(itertools.product(clips, settings_list)):
+            row = run_one(clip, settings, tmp / f"bench_{n}.mp4", metrics)
+            rows.append(row)
+            if on_result:
+                on_result(row)
+    if report:
+        write_report(rows, report)
+    return rows
+
+
+def write_report(rows, path):
+    """Writes rows as JSON if ``path`` ends in .json, otherwise as CSV."""
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        path.write_text(json.dumps(rows, indent=2))
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,154 @@
+"""Which video encoders this machine's ffmpeg can actually use, and how fast.
+
+``ffmpeg -encoders`` only says what was compiled in; a hardware encoder is
+listed whether or not the GPU or driver is present. So each candidate is
+also tried on a short lavfi test clip, timing the encode. The result is
+cached as JSON in the cache directory and probed again only when the
+ffmpeg binary changes.
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from engine import CODEC_FAMILY, log, preset_args
+from probe import cache_dir
+
+# Candidates in order of preference when throughput ties
+CANDIDATES = (
+    "hevc_videotoolbox", "h264_videotoolbox",
+    "hevc_nvenc", "h264_nvenc",
+    "hevc_qsv", "h264_qsv",
+    "libsvtav1", "libx264", "libx265",
+)
+TEST_SIZE = "640x360"
+TEST_FRAMES = 60
+TEST_RATE = 30
+TEST_PRESET = "medium"
+
+
+def list_encoders():
+    """Names of the video encoders compiled into ffmpeg."""
+    out = subprocess.check_output(["ffmpeg", "-hide_banner", "-encoders"],
+                                  text=True, stderr=subprocess.DEVNULL)
+    names = set()
+    for line in out.splitlines():
+        parts = line.split()
+        # " V....D libx264   description"; the legend above uses "V..... = Video"
+        if len(parts) > 1 and parts[0].startswith("V") and parts[1] != "=":
+            names.add(parts[1])
+    return names
+
+
+def list_hwaccels():
+    """Hardware decode methods ffmpeg was built with."""
+    out = subprocess.check_output(["ffmpeg", "-hide_banner", "-hwaccels"],
+                                  text=True, stderr=subprocess.DEVNULL)
+    lines = out.splitlines()
+    for i, line in enumerate(lines):
+        if line.rstrip().endswith(":"):
+            return [name.strip() for name in lines[i + 1:] if name.strip()]
+    return []
+
+
+def test_encode(codec):
+    """Encodes a short test clip with ``codec``; returns frames per second.
+
+    Raises RuntimeError with ffmpeg's last error line if the encode fails.
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-v", "error", "-nostdin",
+           "-f", "lavfi", "-i",
+           f"testsrc2=size={TEST_SIZE}:rate={TEST_RATE}:duration={TEST_FRAMES / TEST_RATE}",
+           "-c:v", codec, *preset_args(codec, TEST_PRESET), "-pix_fmt", "yuv420p",
+           "-f", "null", "-"]
+    t0 = time.perf_counter()
+    res = subprocess.run(cmd, capture_output=True, text=True, errors="replace")
+    wall = time.perf_counter() - t0
+    if res.returncode != 0:
+        lines = res.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"exit status {res.returncode}")
+    return TEST_FRAMES / wall if wall > 0 else 0.0
+
+
+def _ffmpeg_id():
+    """Identifies the ffmpeg binary, so an upgrade invalidates the cache."""
+    path = shutil.which("ffmpeg")
+    if not path:
+        return None
+    st = os.stat(path)
+    return f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def probe_capabilities():
+    """Tests every candidate the local ffmpeg has; returns the report dict."""
+    compiled = list_encoders()
+    encoders = {}
+    for codec in CANDIDATES:
+        if codec not in compiled:
+            continue
+        try:
+            encoders[codec] = {"ok": True, "fps": round(test_encode(codec), 1)}
+        except (OSError, RuntimeError) as e:
+            encoders[codec] = {"ok": False, "error": str(e)}
+    return {"ffmpeg": _ffmpeg_id(), "hwaccels": list_hwaccels(), "encoders": encoders}
+
+
+class Capabilities:
+    """Probe results, loaded from the JSON cache when still valid."""
+
+    def __init__(self, path=None):
+        self.path = path or cache_dir() / "capabilities.json"
+        self.data = None
+        self._lock = threading.Lock()
+
+    def load(self, refresh=False):
+        with self._lock:
+            if self.data is not None and not refresh:
+                return self.data
+            ident = _ffmpeg_id()
+            if ident is None:
+                self.data = {"ffmpeg": None, "hwaccels": [], "encoders": {}}
+                return self.data
+            if not refresh:
+                try:
+                    cached = json.loads(self.path.read_text())
+                    if cached.get("ffmpeg") == ident:
+                        self.data = cached
+                        return cached
+                except (OSError, ValueError):
+                    pass
+            log.info("probing encoders, this takes a few seconds once")
+            self.data = probe_capabilities()
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.path.write_text(json.dumps(self.data, indent=2))
+            except OSError:
+                pass
+            return self.data
+
+    def working(self):
+        """Working encoders, fastest first."""
+        encoders = self.load()["encoders"]
+        ok = [c for c in CANDIDATES if encoders.get(c, {}).get("ok")]
+        return sorted(ok, key=lambda c: -encoders[c]["fps"])
+
+    def best_encoder(self, families=None):
+        """Fastest working encoder producing one of ``families`` (e.g. "hevc")."""
+        for codec in self.working():
+            if families is None or CODEC_FAMILY.get(codec) in families:
+                return codec
+        return None
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_capabilities():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Capabilities()
+        return _default
@@ -0,0 +1,154 @@
+"""Chunked encoding: one long input split at keyframes and encoded in parallel.
+
+The video is cut into segments at keyframes inside the trim range, each
+segment is encoded as a video-only ffmpeg process, and the audio is encoded
+once over the whole range so it has no seams. The pieces are then joined
+with the concat demuxer and muxed with the audio, all with ``-c copy``.
+"""
+import bisect
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+from engine import PROGRESS_ARGS, build_command, clip_range, hvc1_args, run_ffmpeg
+from progress import EventBus, ProgressEvent
+
+# Segments shorter than this aren't worth a separate process
+MIN_SEGMENT = 10.0
+# Cut just before each keyframe: the segment ending there stops short of
+# it, and the one starting there seeks back to the previous keyframe and
+# decodes forward to it, so every frame lands in exactly one segment.
+CUT_EPSILON = 0.001
+
+
+def keyframe_times(path, start=None, end=None):
+    """Presentation times of the video keyframes, from packet flags (no decoding).
+
+    With ``start``/``end`` only packets around that range are read.
+    """
+    interval = []
+    if start is not None:
+        interval = ["-read_intervals", f"{start:.3f}%{'' if end is None else f'{end:.3f}'}"]
+    out = subprocess.check_output([
+        "ffprobe", "-v", "error", "-select_streams", "v:0", *interval,
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(path)
+    ], text=True)
+    times = []
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                times.append(float(pts))
+            except ValueError:
+                pass
+    return sorted(times)
+
+
+def split_points(keyframes, start, end, segments):
+    """``(start, end)`` ranges splitting ``[start, end)`` at the keyframes
+    closest to equal-length cuts."""
+    cuts = [start]
+    for i in range(1, segments):
+        ideal = start + (end - start) * i / segments
+        j = bisect.bisect_left(keyframes, ideal)
+        near = [keyframes[k] for k in (j - 1, j) if 0 <= k < len(keyframes)]
+        if not near:
+            break
+        kf = min(near, key=lambda t: abs(t - ideal)) - CUT_EPSILON
+        if cuts[-1] + MIN_SEGMENT <= kf <= end - MIN_SEGMENT:
+            cuts.append(kf)
+    cuts.append(end)
+    return list(zip(cuts, cuts[1:]))
+
+
+def _concat_entry(path):
+    return "file '" + str(path).replace("'", "'\\''") + "'\n"
+
+
+def encode_chunked(job, out, events, segments, has_audio=True):
+    """Encodes ``job`` as up to ``segments`` parallel pieces joined into ``out``.
+
+    Progress for all pieces is summed into events for ``job`` on ``events``.
+    Returns False if the job was cancelled.
+    """
+    settings = job.data
+    inp = Path(job.key)
+    out = Path(out)
+    start, length = clip_range(settings)
+    end = start + job.duration if length is None else start + length
+    ranges = split_points(keyframe_times(inp, start, end), start, end, segments)
+    threads = max(1, job.threads // len(ranges))
+
+    # Segment progress goes to a private bus and is summed up per file
+    positions = [0.0] * len(ranges)
+    frames = [0] * len(ranges)
+    rates = [(0.0, 0.0)] * len(ranges)
+    seg_bus = EventBus()
+
+    def on_segment(ev):
+        positions[ev.job] = ev.out_time
+        frames[ev.job] = max(frames[ev.job], ev.frame)
+        rates[ev.job] = (ev.fps, ev.speed)
+        events.publish(ProgressEvent(
+            job, out_time=sum(positions), duration=job.duration, frame=sum(frames),
+            fps=sum(r[0] for r in rates), speed=sum(r[1] for r in rates)))
+    seg_bus.subscribe(on_segment)
+    # Set when a piece fails, to stop the others. The job's own cancel event
+    # is left alone so the encoder can still retry the job (e.g. in software).
+    stop = threading.Event()
+
+    # Scratch files live next to the output, which is where the space is
+    with tempfile.TemporaryDirectory(prefix=".chunks_", dir=out.parent) as tmp:
+        tmp = Path(tmp)
+        seg_files = [tmp / f"seg_{i:03d}.mkv" for i in range(len(ranges))]
+        audio_file = tmp / "audio.m4a"
+
+        def encode_segment(i):
+            a, b = ranges[i]
+            seg = replace(settings, trim_start=f"{a:.6f}", trim_end=f"{b:.6f}")
+            cmd = build_command(inp, seg_files[i], seg, threads, audio=False)
+            return run_ffmpeg(cmd, job, seg_bus, duration=b - a, key=i, stop=stop)
+
+        def encode_audio():
+            cmd = ["ffmpeg", "-y", "-v", "error"] + PROGRESS_ARGS
+            if settings.trim_start:
+                cmd += ["-ss", settings.trim_start]
+            cmd += ["-i", str(inp), "-t", f"{end - start:.3f}", "-vn"]
+            if settings.mono:
+                cmd += ["-ac", "1"]
+            cmd += ["-c:a", "aac", "-b:a", settings.audio_bitrate, str(audio_file)]
+            # Audio is cheap next to video, so it doesn't count towards progress
+            return run_ffmpeg(cmd, job, EventBus(), stop=stop)
+
+        def run(piece, *args):
+            try:
+                return piece(*args)
+            except Exception:
+                # Stop the other pieces rather than finishing a doomed file
+                stop.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=len(ranges) + 1) as pool:
+            futures = [pool.submit(run, encode_segment, i) for i in range(len(ranges))]
+            if has_audio:
+                futures.append(pool.submit(run, encode_audio))
+            results = [f.result() for f in futures]
+        if not all(results):
+            return False
+
+        concat_list = tmp / "segments.txt"
+        concat_list.write_text("".join(_concat_entry(f) for f in seg_files))
+        cmd = ["ffmpeg", "-y", "-v", "error"] + PROGRESS_ARGS + [
+            "-f", "concat", "-safe", "0", "-i", str(concat_list)]
+        if has_audio:
+            cmd += ["-i", str(audio_file), "-map", "0:v:0", "-map", "1:a:0"]
+        cmd += ["-c", "copy", *hvc1_args(settings.codec), "-movflags", "+faststart", str(out)]
+        # Joining is quick; its own progress would restart the file's bar
+        if not run_ffmpeg(cmd, job, EventBus()):
+            return False
+    events.publish(ProgressEvent(job, status="end", out_time=job.duration,
+                                 duration=job.duration))
+    return True
@@ -0,0 +1,778 @@
+"""Encode engine shared by the GUI and the headless command line.
+
+Nothing in here imports tkinter, so batches can run on machines without a
+display.
+"""
+import functools
+import itertools
+import logging
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, fields, replace
+from pathlib import Path
+
+from journal import Journal, partial_path, settings_hash
+from preview import SUPPORTED as PREVIEW_SUPPORTED
+from preview import PreviewReader, preview_output_args
+from probe import default_cache
+from progress import PROGRESS_ARGS, EventBus, ProgressEvent, ProgressReader, drain
+from scan import scan
+from scheduler import (QUEUED, RUNNING, Job, JobScheduler, auto_workers, is_hw_codec,
+                       threads_per_job)
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".flv", ".wmv")
+PRESETS = ["ultrafast", "fast", "medium", "slow", "slower", "veryslow"]
+# Size budget used when recommending a video bitrate
+TARGET_SIZE = 350 * 1024 * 1024
+# Target-size mode: how far off the budget an output may land before it is
+# re-encoded, and how many corrective re-encodes to allow.
+SIZE_TOLERANCE = 0.05
+MAX_SIZE_RETRIES = 2
+# Encoders that get a real two-pass encode in target-size mode; anything
+# else (VideoToolbox) uses constrained VBR instead.
+TWO_PASS_CODECS = ("libx264", "libx265")
+# Encoder -> the ffprobe codec_name of what it produces
+CODEC_FAMILY = {
+    "libx265": "hevc", "hevc_videotoolbox": "hevc", "hevc_nvenc": "hevc", "hevc_qsv": "hevc",
+    "libx264": "h264", "h264_videotoolbox": "h264", "h264_nvenc": "h264", "h264_qsv": "h264",
+    "libsvtav1": "av1",
+}
+# Software encoder to fall back to when a hardware one fails
+SOFTWARE_ENCODERS = {"hevc": "libx265", "h264": "libx264", "av1": "libsvtav1"}
+# Codec setting meaning "the fastest encoder that works here" (see
+# capabilities.py) for the default codec's format; "auto-h264" etc. pick
+# the format explicitly
+AUTO_CODEC = "auto"
+AUTO_CODECS = [AUTO_CODEC] + [f"{AUTO_CODEC}-{family}" for family in SOFTWARE_ENCODERS]
+# SVT-AV1 takes a numeric preset (lower is slower)
+SVT_PRESETS = {"ultrafast": 12, "fast": 10, "medium": 8, "slow": 6, "slower": 4, "veryslow": 2}
+# Shorter clips aren't worth splitting for chunked encoding
+CHUNK_MIN_DURATION = 300
+
+log = logging.getLogger(__name__)
+
+
+def apple_silicon():
+    return sys.platform == "darwin" and platform.machine().startswith("arm")
+
+
+def default_codec(hw=None):
+    if hw is None:
+        hw = apple_silicon()
+    return "hevc_videotoolbox" if hw else "libx265"
+
+
+def auto_family(codec):
+    """Format an "auto" codec setting is limited to, or None for a real encoder."""
+    if codec == AUTO_CODEC:
+        return CODEC_FAMILY[default_codec()]
+    if codec in AUTO_CODECS:
+        return codec.split("-", 1)[1]
+    return None
+
+
+def software_fallback(codec):
+    """Software encoder for the same format as hardware ``codec``, else None."""
+    if not is_hw_codec(codec):
+        return None
+    return SOFTWARE_ENCODERS.get(CODEC_FAMILY.get(codec))
+
+
+def preset_args(codec, preset):
+    if codec == "libsvtav1":
+        return ["-preset", str(SVT_PRESETS.get(preset, 8))]
+    return ["-preset", preset]
+
+
+def quality_args(codec, crf):
+    """Constant-quality rate control in the encoder's own terms."""
+    if codec.endswith("_nvenc"):
+        return ["-rc", "vbr", "-cq", str(crf), "-b:v", "0"]
+    if codec.endswith("_qsv"):
+        return ["-global_quality", str(crf)]
+    if codec.endswith("_videotoolbox"):
+        # VideoToolbox ignores -crf; its -q:v runs 1-100, higher is better,
+        # so map the CRF scale (0-51, lower is better) onto it linearly
+        return ["-q:v", str(max(1, min(100, round(100 - crf * 100 / 51))))]
+    return ["-crf", str(crf)]
+
+
+def hvc1_args(codec, spec="v"):
+    """Tags HEVC from ``codec`` as hvc1, which Apple players need in MP4."""
+    if CODEC_FAMILY.get(codec) == "hevc":
+        return [f"-tag:{spec}", "hvc1"]
+    return []
+
+
+@dataclass(frozen=True, slots=True)
+class EncodeSettings:
+    """Encode settings for one or more files. ``video_bitrate`` of 0 means CRF mode.
+
+    Immutable and hashable: files with the same settings share one object
+    (see intern_settings), and changing a file's settings replaces it.
+    """
+    resolution: str = "640x360"
+    codec: str = "libx265"
+    crf: int = 28
+    preset: str = "slow"
+    audio_bitrate: str = "96k"
+    video_bitrate: int = 0  # kbit/s
+    mono: bool = False
+    trim_start: str = ""
+    trim_end: str = ""
+    target_size: float = 0  # MB; 0 disables target-size mode
+    # Auto-tune the CRF to the cheapest one meeting this score, 0 disables
+    quality_target: float = 0
+    quality_metric: str = "ssim"  # "ssim" (0-1), "vmaf" (0-100) or "psnr" (dB)
+    # Copy streams that already meet the settings instead of re-encoding them
+    stream_copy: bool = True
+    # Rendition ladder such as "1920x1080:5000,1280x720,640x360" (WxH[:kbit/s])
+    # encoded from one decode instead of ``resolution`` (see ladder.py).
+    # Target size, auto-tuning, chunking and stream copy don't apply to it.
+    renditions: str = ""
+    streaming: str = ""  # ladder as MP4 files (""), "hls" or "dash"
+
+    @classmethod
+    def from_dict(cls, d):
+        names = {f.name for f in fields(cls)}
+        return intern_settings(cls(**{k: v for k, v in d.items() if k in names}))
+
+    def to_dict(self):
+        return asdict(self)
+
+    def update(self, **changes):
+        """Copy with ``changes`` applied, shared with equal settings elsewhere."""
+        return intern_settings(replace(self, **changes))
+
+    def describe(self):
+        # A ladder ignores the target size and auto CRF
+        if self.target_size > 0 and not self.renditions:
+            rate = f"Target: {self.target_size:g} MB"
+        elif self.quality_target > 0 and not self.renditions:
+            rate = f"Auto CRF ({self.quality_metric} >= {self.quality_target:g})"
+        elif self.video_bitrate > 0:
+            rate = f"Bitrate: {self.video_bitrate}k"
+        else:
+            rate = f"CRF: {self.crf}"
+        res = f"Ladder: {self.renditions}" if self.renditions else f"Res: {self.resolution}"
+        if self.renditions and self.streaming:
+            res += f" ({self.streaming.upper()})"
+        return f"{res} | Codec: {self.codec} | {rate} | Audio: {self.audio_bitrate}"
+
+
+_interned = {}
+_interned_lock = threading.Lock()
+
+
+def intern_settings(settings):
+    """The one shared object equal to ``settings``."""
+    with _interned_lock:
+        return _interned.setdefault(settings, settings)
+
+
+def recommend_settings(info, base, hw=None):
+    """Settings tuned to a probed file (see probe.MediaInfo), starting from ``base``.
+
+    Raises ValueError if the file has no video stream or no duration.
+    """
+    if not info.size:
+        raise ValueError("no video stream")
+    if info.duration <= 0:
+        raise ValueError("unknown duration")
+    w, h = info.size
+    ch = info.audio_channels or 1
+    # Recommend audio bitrate based on channels
+    rec_ab = 96 if ch == 1 else 128
+    total_bitrate = TARGET_SIZE * 8 / info.duration
+    vk = int(max(total_bitrate - rec_ab * 1000, 100000) / 1000)
+    return replace(
+        base, resolution=f"{w}x{h}", codec=default_codec(hw), preset="slow",
+        audio_bitrate=f"{rec_ab}k", video_bitrate=vk,
+        crf=28,  # Reset CRF as bitrate is now primary
+        mono=(ch == 1))
+
+
+def parse_time(value):
+    """Seconds from "ss", "mm:ss" or "hh:mm:ss[.fff]"."""
+    secs = 0.0
+    for part in value.strip().split(":"):
+        secs = secs * 60 + float(part)
+    return secs
+
+
+def parse_bitrate(value):
+    """Bits per second from an ffmpeg-style rate such as "96k" or "1.5M"."""
+    value = value.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(value[-1:], 1)
+    return float(value.rstrip("km")) * scale
+
+
+def clip_range(settings):
+    """``(start, length)`` in seconds of the part of the input that is encoded.
+
+    ``length`` is None when the clip runs to the end of the input.
+    """
+    start = parse_time(settings.trim_start) if settings.trim_start else 0.0
+    if not settings.trim_end:
+        return start, None
+    return start, max(parse_time(settings.trim_end) - start, 0.0)
+
+
+def clip_duration(duration, settings):
+    """Length of the encoded output given the input's ``duration`` (0 if unknown)."""
+    start, length = clip_range(settings)
+    rest = max(duration - start, 0.0)
+    if length is None:
+        return rest
+    return min(length, rest) if duration else length
+
+
+def target_video_bitrate(target_bytes, duration, audio_bitrate):
+    """Video kbit/s that fits ``duration`` seconds plus audio into ``target_bytes``."""
+    total = target_bytes * 8 / duration
+    video = total - parse_bitrate(audio_bitrate)
+    if video < 50000:
+        raise ValueError("target size is too small for this clip length")
+    return int(video / 1000)
+
+
+def output_path(inp, outdir, settings=None, n=1):
+    """Output file for ``inp``, or the directory a rendition ladder goes into.
+
+    ``n`` > 1 numbers the name, for inputs of the same name from different
+    folders (see BatchEncoder.submit).
+    """
+    stem = Path(inp).stem if n <= 1 else f"{Path(inp).stem}_{n}"
+    if settings is not None and settings.renditions:
+        return Path(outdir) / f"{stem}_ladder"
+    return Path(outdir) / f"{stem}_mobile.mp4"
+
+
+def remove_output(path):
+    """Deletes an output file or ladder directory, if it exists."""
+    path = Path(path)
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def collect_inputs(paths, recursive=False, include=(), exclude=()):
+    """Expand directories into the video files they contain, without duplicates."""
+    return [p for p, _ in scan(paths, recursive, VIDEO_EXTENSIONS, include, exclude)]
+
+
+def build_command(inp, out, settings, threads=0, bitrate=0, pass_num=0, passlog=None,
+                  audio=True, copy=()):
+    """ffmpeg command line encoding ``inp`` to ``out`` with progress on stdout.
+
+    ``bitrate`` (kbit/s) overrides the settings' rate control, as used by
+    target-size mode: with ``pass_num`` it becomes a two-pass encode logging
+    to ``passlog`` (pass 1 writes no output), otherwise constrained VBR.
+    ``audio=False`` writes a video-only file. ``copy`` names the stream
+    kinds ("video", "audio") to copy instead of re-encoding (see remux.py).
+    """
+    before, after = _command_parts(settings, threads, bitrate, pass_num, passlog,
+                                   audio, frozenset(copy))
+    cmd = [*before, "-i", str(inp), *after]
+    if pass_num != 1:
+        cmd.append(str(out))
+    return cmd
+
+
+@functools.lru_cache(maxsize=1024)
+def _command_parts(settings, threads, bitrate, pass_num, passlog, audio, copy):
+    """The options before and after ``-i`` for build_command.
+
+    They only depend on the settings, so files sharing a settings object
+    share one cached copy instead of rebuilding it per file.
+    """
+    cmd = ["ffmpeg", "-y", "-v", "error"] + PROGRESS_ARGS
+    start, length = clip_range(settings)
+    if settings.trim_start:
+        cmd += ["-ss", settings.trim_start]
+    if "videotoolbox" in settings.codec and "video" not in copy:
+        cmd += ["-hwaccel", "videotoolbox"]
+    before, cmd = tuple(cmd), []
+    if length is not None:
+        # Output timestamps restart at 0 after an input -ss, so trim by length
+        cmd += ["-t", f"{length:.3f}"]
+    if "video" in copy:
+        cmd += ["-c:v", "copy", *hvc1_args(settings.codec)]
+        return before, tuple(cmd + _audio_args(settings, audio, copy))
+    cmd += [
+        "-c:v", settings.codec, *preset_args(settings.codec, settings.preset),
+        "-vf", f"scale={settings.resolution}", "-pix_fmt", "yuv420p",
+    ]
+    if bitrate and pass_num:
+        cmd += ["-b:v", f"{bitrate}k"]
+        if settings.codec == "libx265":
+            cmd += ["-x265-params", f"pass={pass_num}:stats={passlog}"]
+        else:
+            cmd += ["-pass", str(pass_num), "-passlogfile", passlog]
+    elif bitrate:
+        cmd += ["-b:v", f"{bitrate}k", "-maxrate", f"{bitrate}k",
+                "-bufsize", f"{bitrate * 2}k"]
+    elif settings.video_bitrate > 0:
+        cmd += ["-b:v", f"{settings.video_bitrate}k"]
+    else:
+        cmd += quality_args(settings.codec, settings.crf)
+    if threads:
+        # Per-job thread budget so concurrent encodes don't oversubscribe
+        cmd += ["-threads", str(threads)]
+    if pass_num == 1:
+        return before, tuple(cmd + ["-an", "-f", "null", "-"])
+    return before, tuple(cmd + _audio_args(settings, audio, copy))
+
+
+def _audio_args(settings, audio=True, copy=()):
+    if not audio:
+        return ["-an"]
+    if "audio" in copy:
+        return ["-c:a", "copy"]
+    args = ["-ac", "1"] if settings.mono else []
+    return args + ["-c:a", "aac", "-b:a", settings.audio_bitrate]
+
+
+# ru_maxrss is in kilobytes everywhere except macOS, where it is bytes
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class FFmpegError(RuntimeError):
+    """An ffmpeg process exited with an error."""
+
+
+def _reap(proc, block):
+    """Like Popen.poll()/wait() but also returns the child's rusage (POSIX).
+
+    Returns ``(returncode, rusage)``; both are None while still running.
+    """
+    if proc.returncode is not None or not hasattr(os, "wait4"):
+        return (proc.wait() if block else proc.poll()), None
+    try:
+        pid, status, usage = os.wait4(proc.pid, 0 if block else os.WNOHANG)
+    except ChildProcessError:
+        return proc.wait(), None
+    if pid == 0:
+        return None, None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage
+
+
+def supervise(proc, job, stop=None):
+    """Waits for ffmpeg, stopping/continuing it as the job is paused or resumed.
+
+    ``stop`` is an extra Event that terminates the process like a cancel
+    without cancelling the job. Adds the process's CPU time and peak RSS
+    to the job where the OS reports them.
+    """
+    stopped = False
+    while True:
+        code, usage = _reap(proc, block=False)
+        if code is not None:
+            break
+        if job.cancel_event.is_set() or (stop is not None and stop.is_set()):
+            if stopped:
+                proc.send_signal(signal.SIGCONT)
+            proc.terminate()
+            code, usage = _reap(proc, block=True)
+            break
+        # SIGSTOP freezes ffmpeg outright; without it (Windows) pausing
+        # only holds back new jobs.
+        if job.paused != stopped and hasattr(signal, "SIGSTOP"):
+            proc.send_signal(signal.SIGSTOP if job.paused else signal.SIGCONT)
+            stopped = job.paused
+        time.sleep(0.1)
+    if usage is not None:
+        job.cpu_time += usage.ru_utime + usage.ru_stime
+        job.peak_rss = max(job.peak_rss, usage.ru_maxrss * RSS_UNIT)
+
+
+def run_ffmpeg(cmd, job, bus, duration=0.0, offset=0.0, cwd=None, final=True, key=None,
+               preview=None, stop=None):
+    """Runs one ffmpeg process for ``job``; returns False if it was cancelled
+    or ``stop`` (see supervise) was set.
+
+    Progress is published on ``bus`` under ``key`` (the job itself by
+    default). ``offset`` shifts reported progress for jobs made of several
+    passes; ``final`` is False for passes that are followed by another.
+    ``preview`` is a PreviewSink to feed frames from this encode into.
+    Raises FFmpegError with ffmpeg's last error line if it fails.
+    """
+    pass_fds = ()
+    if preview is not None and PREVIEW_SUPPORTED:
+        read_fd, write_fd = os.pipe()
+        _, length = clip_range(job.data)
+        cmd = cmd + preview_output_args(write_fd, length)
+        pass_fds = (write_fd,)
+    # No stdin: concurrent ffmpegs would otherwise fight over the terminal
+    try:
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, cwd=cwd, pass_fds=pass_fds,
+            text=True, encoding='utf-8', errors='replace')
+    finally:
+        for fd in pass_fds:
+            os.close(fd)  # ffmpeg holds the write end now
+    if pass_fds:
+        PreviewReader(read_fd, job, preview).start()
+    errors = drain(proc.stderr)
+    reader = ProgressReader(proc.stdout, job if key is None else key, bus,
+                            duration=duration, offset=offset, final=final)
+    reader.start()
+    supervise(proc, job, stop)
+    reader.join()
+    if job.cancel_event.is_set() or (stop is not None and stop.is_set()):
+        return False
+    if proc.returncode != 0:
+        detail = errors[-1] if errors else f"exit code {proc.returncode}"
+        raise FFmpegError(f"ffmpeg failed: {detail}")
+    return True
+
+
+class BatchEncoder:
+    """Encodes files into ``outdir`` on a JobScheduler, publishing progress on ``events``."""
+
+    def __init__(self, outdir, events=None, probe_cache=None, chunks=0, resume=True,
+                 preview=None, telemetry=None, reserve_mb=None, per_device=0):
+        self.outdir = Path(outdir)
+        # PreviewSink that single-process encodes send preview frames to
+        self.preview = preview
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.journal = Journal(self.outdir)
+        # Skip jobs whose output the journal shows is already up to date
+        self.resume = resume
+        # Split clips of at least CHUNK_MIN_DURATION into this many segments
+        # encoded in parallel (see chunked.py); 0 or 1 disables it.
+        self.chunks = chunks
+        self.events = events or EventBus()
+        self.probe_cache = probe_cache or default_cache()
+        # telemetry.Telemetry recording every finished job, if any
+        self.telemetry = telemetry
+        # Hold jobs back while their output wouldn't fit above reserve_mb of
+        # free space, or while per_device jobs already read the same disk
+        # (see admission.py). reserve_mb None turns admission control off.
+        self.admission = None
+        if reserve_mb is not None or per_device:
+            # Imported here as admission.py builds on this module
+            from admission import DEFAULT_RESERVE_MB, Admission
+            self.admission = Admission(
+                self.outdir, self.probe_cache,
+                DEFAULT_RESERVE_MB if reserve_mb is None else reserve_mb, per_device)
+        self.scheduler = None
+        # Hardware encoders found unusable this batch; their jobs use software
+        self.broken_codecs = set()
+        self._broken_lock = threading.Lock()
+        # Format family -> the encoder an "auto" codec resolved to, once needed
+        self.auto_codecs = {}
+        # Output name (casefolded) -> the job writing it
+        self._outputs = {}
+        self._outputs_lock = threading.Lock()
+
+    @staticmethod
+    def _track(event):
+        # Feed job positions so the scheduler can combine progress
+        if isinstance(event.job, Job):
+            event.job.update(event.out_time)
+            # Later passes restart from frame 0
+            event.job.frames = max(event.job.frames, event.frame)
+
+    def start(self, items, workers=0):
+        """Queue ``(path, EncodeSettings)`` pairs and start encoding them.
+
+        Returns the running scheduler; call ``join()`` on it to wait. Items
+        are prioritised in the order given.
+        """
+        items = [(p, self.resolve_codec(s)) for p, s in items]
+        if workers <= 0:
+            workers = auto_workers(s.codec for _, s in items)
+        workers = max(1, min(workers, len(items)))
+        if self.admission:
+            # Size estimates need every file's duration; probe them in parallel now
+            self.probe_cache.warm([p for p, _ in items])
+        scheduler = self._new_scheduler(workers)
+        for prio, (inp, settings) in enumerate(items):
+            self.submit(inp, settings, prio)
+        scheduler.start()
+        scheduler.close()
+        return scheduler
+
+    def open(self, workers, on_finish=None):
+        """Starts a scheduler that stays open for submit() until closed.
+
+        It forgets jobs once they finish, so memory stays flat however long
+        it runs (see watch.py). ``on_finish(job)`` is called after each job.
+        """
+        scheduler = self._new_scheduler(workers, keep_finished=False, on_finish=on_finish)
+        scheduler.start()
+        return scheduler
+
+    def _new_scheduler(self, workers, keep_finished=True, on_finish=None):
+        def finished(job):
+            self._finished(job)
+            if on_finish:
+                on_finish(job)
+
+        # Subscribed only while the scheduler runs, as ``events`` may be a
+        # long-lived bus that many batches use (the GUI's)
+        unsubscribe = [self.events.subscribe(self._track)]
+        if self.telemetry:
+            unsubscribe.append(self.events.subscribe(self.telemetry.on_progress))
+
+        def exited():
+            for u in unsubscribe:
+                u()
+
+        self.scheduler = JobScheduler(
+            self.encode, workers=workers, on_finish=finished,
+            admit=self.admission.admit if self.admission else None, keep_finished=keep_finished,
+            on_exit=exited)
+        return self.scheduler
+
+    def submit(self, inp, settings, priority=0):
+        """Queues one file on the current scheduler; returns its Job."""
+        job = Job(Path(inp), priority=priority, data=settings)
+        job.threads = threads_per_job(self.scheduler.workers)
+        job.output = self._claim_output(job)
+        try:
+            if self.admission:
+                # Size the job up here rather than under the scheduler's lock.
+                # Jobs the journal will skip write nothing.
+                self.admission.prepare(job, skip=self.resume and self.journal.is_up_to_date(
+                    job.key, job.output, settings_hash(settings)))
+            return self.scheduler.submit(job)
+        except Exception:
+            self._release_output(job)
+            raise
+
+    def _claim_output(self, job):
+        """Output path for ``job`` that no other queued or running job writes.
+
+        A recursive scan can find ``a/clip.mp4`` and ``b/clip.mp4``; the
+        second one queued gets ``clip_2_mobile.mp4`` rather than overwriting
+        the first one's output (and sharing its partial file). Names are
+        compared casefolded, for case-insensitive filesystems. Raises
+        ValueError if the same input is already queued or running.
+        """
+        with self._outputs_lock:
+            for n in itertools.count(1):
+                out = output_path(job.key, self.outdir, job.data, n)
+                other = self._outputs.get(str(out).casefold())
+                if other is None or other.state not in (QUEUED, RUNNING):
+                    break
+                if other.key == job.key:
+                    raise ValueError(f"{job.key} is already queued")
+            self._outputs[str(out).casefold()] = job
+        if n > 1:
+            log.info("%s: another input is already writing %s, writing %s instead",
+                     job.key, output_path(job.key, self.outdir, job.data).name, out.name)
+        return out
+
+    def _release_output(self, job):
+        with self._outputs_lock:
+            if self._outputs.get(str(job.output).casefold()) is job:
+                del self._outputs[str(job.output).casefold()]
+
+    def resolve_codec(self, settings):
+        """``settings`` with the "auto" codec replaced by a concrete encoder."""
+        family = auto_family(settings.codec)
+        if family is None:
+            return settings
+        if family not in self.auto_codecs:
+            # Imported here as capabilities.py builds on this module
+            from capabilities import default_capabilities
+            codec = default_capabilities().best_encoder([family]) or SOFTWARE_ENCODERS[family]
+            log.info("%s codec: %s", settings.codec, codec)
+            self.auto_codecs[family] = codec
+        return settings.update(codec=self.auto_codecs[family])
+
+    def _finished(self, job):
+        if self.admission:
+            self.admission.release(job)
+        if self.telemetry:
+            self.telemetry.record(job, job.output)
+        self._release_output(job)
+
+    def run(self, items, workers=0):
+        scheduler = self.start(items, workers)
+        scheduler.join()
+        return scheduler
+
+    def encode(self, job):
+        """Runs a single job's encode; called from a scheduler worker thread."""
+        inp = job.key
+        settings = job.data
+        out = job.output
+        digest = settings_hash(settings)
+        if self.resume and self.journal.is_up_to_date(inp, out, digest):
+            job.skipped = True
+            self.events.publish(ProgressEvent(job, status="end"))
+            return
+        if settings.codec in self.broken_codecs:
+            settings = job.data = replace(settings, codec=software_fallback(settings.codec))
+        try:
+            info = self.probe_cache.get(inp)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            info = None
+        # Avoid division by zero for unreadable files
+        job.duration = clip_duration(info.duration if info else 0, settings) or 1
+        job.media_duration = job.duration
+        self.events.publish(ProgressEvent(job, duration=job.duration))
+
+        # Encode under a temporary name and rename into place only once the
+        # output is complete, so a crash never leaves a truncated file behind.
+        part = partial_path(out)
+        self.journal.started(inp, out, digest)
+        try:
+            try:
+                self._encode_to(job, info, part)
+            except FFmpegError as e:
+                fallback = software_fallback(job.data.codec)
+                if fallback is None or job.cancel_event.is_set():
+                    raise
+                log.warning("%s: %s failed (%s), retrying with %s",
+                            inp.name, job.data.codec, e, fallback)
+                self._check_encoder(job.data.codec)
+                job.data = replace(job.data, codec=fallback)
+                self._encode_to(job, info, part)
+        except Exception as e:
+            self.journal.failed(inp, out, digest, error=str(e))
+            remove_output(part)
+            raise
+        if job.cancel_event.is_set():
+            self.journal.failed(inp, out, digest, status="cancelled")
+            remove_output(part)
+            return
+        if out.is_dir():
+            # An earlier ladder; os.replace only overwrites files
+            shutil.rmtree(out)
+        os.replace(part, out)
+        self.journal.finished(inp, out, digest)
+
+    def _check_encoder(self, codec):
+        """Marks the hardware encoder ``codec`` broken for the rest of the
+        batch if it can't encode a test clip either.
+
+        One file failing may be down to that file (its format, size), so it
+        alone doesn't send every later job to software.
+        """
+        # Imported here as capabilities.py builds on this module
+        from capabilities import test_encode
+        # One check at a time, so jobs failing together test it only once
+        with self._broken_lock:
+            if codec in self.broken_codecs:
+                return
+            try:
+                test_encode(codec)
+            except (OSError, RuntimeError) as e:
+                # Driver, sessions or the like: later jobs go straight to software
+                log.warning("%s fails a test encode too (%s), using software from now on",
+                            codec, e)
+                self.broken_codecs.add(codec)
+
+    def _encode_to(self, job, info, out):
+        inp = job.key
+        settings = job.data
+        has_video = info is not None and info.stream("video") is not None
+        if settings.renditions:
+            # Imported here as ladder.py builds on this module
+            from ladder import build_ladder_command
+            remove_output(out)
+            out.mkdir()
+            has_audio = info is not None and info.stream("audio") is not None
+            cmd = build_ladder_command(Path(inp).absolute(), settings, job.threads, has_audio)
+            self._run_ffmpeg(job, cmd, cwd=out, preview=has_video)
+            return
+        copy = ()
+        if settings.stream_copy and info is not None:
+            # Imported here as remux.py builds on this module
+            from remux import plan_copy
+            copy, settings = plan_copy(inp, info, settings)
+            if copy:
+                log.info("%s: copying %s", inp.name, " and ".join(sorted(copy)))
+        if "video" in copy:
+            # A trim start may have moved back to a keyframe
+            job.duration = job.media_duration = clip_duration(info.duration, settings) or 1
+            # No preview: tapping frames would mean decoding the copied stream
+            self._run_ffmpeg(job, build_command(inp, out, settings, copy=copy))
+            return
+        if settings.quality_target > 0 and settings.target_size <= 0 and has_video:
+            # Imported here as autotune.py builds on this module
+            from autotune import default_tuner
+            tuned = default_tuner().tune(inp, settings, info.duration, job)
+            if tuned is None:
+                return
+            crf, score = tuned
+            log.info("%s: auto-tuned to CRF %d (%s %.4g)",
+                     inp.name, crf, settings.quality_metric, score)
+            settings = job.data = replace(settings, crf=crf, video_bitrate=0)
+        if settings.target_size > 0:
+            self._encode_to_size(job, out, preview=has_video)
+        elif self.chunks > 1 and info and job.duration >= CHUNK_MIN_DURATION:
+            # Imported here as chunked.py builds on this module
+            from chunked import encode_chunked
+            encode_chunked(job, out, self.events, self.chunks,
+                           has_audio=info.stream("audio") is not None)
+        else:
+            self._run_ffmpeg(job, build_command(inp, out, settings, job.threads, copy=copy),
+                             preview=has_video)
+
+    def _run_ffmpeg(self, job, cmd, offset=0.0, cwd=None, final=True, preview=False):
+        return run_ffmpeg(cmd, job, self.events, duration=job.duration,
+                          offset=offset, cwd=cwd, final=final,
+                          preview=self.preview if preview else None)
+
+    def _encode_to_size(self, job, out, preview=False):
+        """Target-size encode: two-pass (or constrained VBR), then verify the size.
+
+        If the output misses the budget by more than SIZE_TOLERANCE the final
+        pass is repeated with a corrected bitrate, at most MAX_SIZE_RETRIES
+        times. Pass-1 statistics don't depend on the bitrate, so retries
+        reuse them.
+        """
+        settings = job.data
+        inp = Path(job.key).absolute()
+        out = Path(out).absolute()
+        length = job.duration
+        target = settings.target_size * 1024 * 1024
+        bitrate = target_video_bitrate(target, length, settings.audio_bitrate)
+        two_pass = settings.codec in TWO_PASS_CODECS
+        # Pass logs go in a scratch dir used as ffmpeg's cwd; a relative name
+        # keeps drive-letter colons out of -x265-params.
+        passlog = "x265_2pass.log" if settings.codec == "libx265" else "ffmpeg2pass"
+        with tempfile.TemporaryDirectory(prefix="vc_2pass_") as tmp:
+            offset = 0.0
+            if two_pass:
+                job.duration = length * 2
+                cmd = build_command(inp, out, settings, job.threads,
+                                    bitrate=bitrate, pass_num=1, passlog=passlog)
+                if not self._run_ffmpeg(job, cmd, cwd=tmp, final=False):
+                    return
+                offset = length
+            for attempt in range(MAX_SIZE_RETRIES + 1):
+                cmd = build_command(inp, out, settings, job.threads, bitrate=bitrate,
+                                    pass_num=2 if two_pass else 0, passlog=passlog)
+                # Not final: the size check may send it round again
+                if not self._run_ffmpeg(job, cmd, offset=offset, cwd=tmp, final=False,
+                                        preview=preview):
+                    return
+                actual = out.stat().st_size
+                if abs(actual - target) <= target * SIZE_TOLERANCE or attempt == MAX_SIZE_RETRIES:
+                    break
+                log.info("%s: %.1f MB for a %.1f MB target, retrying",
+                         inp.name, actual / 2**20, target / 2**20)
+                bitrate = max(int(bitrate * target / actual), 50)
+                offset += length
+                job.duration += length
+        if actual > target * (1 + SIZE_TOLERANCE):
+            raise RuntimeError(
+                f"output is {actual / 2**20:.1f} MB, over the {settings.target_size:g} MB target")
+        self.events.publish(ProgressEvent(job, status="end", out_time=job.duration,
+                                          duration=job.duration))
@@ -0,0 +1,155 @@
+"""Crash-safe batch journal kept in the output directory.
+
+Every job appends a JSON line when it starts, finishes or fails, flushed and
+fsynced, so after a crash or cancel the next run knows which outputs are
+complete. A finished entry records the input's size/mtime, a hash of the
+encode settings and a checksum of the output; a later run skips the job
+while all of those still match. An output may also be a directory (a
+rendition ladder), which is sized and checksummed over all its files.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+JOURNAL_NAME = ".video_compressor_journal.jsonl"
+
+
+def settings_hash(settings):
+    data = json.dumps(settings.to_dict(), sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def _files(path):
+    path = Path(path)
+    if not path.is_dir():
+        return [path]
+    return sorted(p for p in path.rglob("*") if p.is_file())
+
+
+def file_checksum(path, chunk=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    for name in _files(path):
+        if name != Path(path):
+            h.update(str(name.relative_to(path)).encode() + b"\0")
+        with open(name, "rb") as f:
+            for block in iter(lambda: f.read(chunk), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def output_stat(path):
+    """``(size, mtime_ns)`` of an output file, or totalled over a directory.
+
+    Raises OSError if it doesn't exist.
+    """
+    stats = [os.stat(p) for p in _files(path)]
+    return (sum(st.st_size for st in stats),
+            max((st.st_mtime_ns for st in stats), default=0))
+
+
+def output_size(path):
+    """Bytes in an output file or directory, or 0 if it doesn't exist."""
+    try:
+        return output_stat(path)[0]
+    except OSError:
+        return 0
+
+
+def partial_path(out):
+    """Temporary name an output is encoded to before being renamed into place."""
+    out = Path(out)
+    return out.with_name(f"{out.stem}.part{out.suffix}")
+
+
+class Journal:
+    def __init__(self, outdir):
+        self.path = Path(outdir) / JOURNAL_NAME
+        self._lock = threading.Lock()
+        # Latest record per output file name
+        self.entries = {}
+        self._load()
+
+    def _load(self):
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        lines = 0
+        with f:
+            for line in f:
+                lines += 1
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                self.entries[rec["output"]] = rec
+        # Rewrite once old runs have left mostly superseded lines behind
+        if lines > 2 * len(self.entries) + 100:
+            self.compact()
+
+    def compact(self):
+        with self._lock:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for rec in self.entries.values():
+                    f.write(json.dumps(rec) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+    def _append(self, rec):
+        rec["time"] = time.time()
+        with self._lock:
+            self.entries[rec["output"]] = rec
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def _input_state(inp):
+        st = os.stat(inp)
+        return {"input": os.path.abspath(inp), "input_size": st.st_size,
+                "input_mtime_ns": st.st_mtime_ns}
+
+    def started(self, inp, out, settings_digest):
+        self._append({"output": Path(out).name, "status": "running",
+                      "settings": settings_digest, **self._input_state(inp)})
+
+    def finished(self, inp, out, settings_digest):
+        size, mtime_ns = output_stat(out)
+        self._append({"output": Path(out).name, "status": "done",
+                      "settings": settings_digest, **self._input_state(inp),
+                      "output_size": size, "output_mtime_ns": mtime_ns,
+                      "checksum": file_checksum(out)})
+
+    def failed(self, inp, out, settings_digest, status="failed", error=""):
+        self._append({"output": Path(out).name, "status": status,
+                      "settings": settings_digest, "error": error,
+                      **self._input_state(inp)})
+
+    def forget(self, out):
+        """Drops ``out``'s record from memory; the file keeps it until compacted."""
+        with self._lock:
+            self.entries.pop(Path(out).name, None)
+
+    def is_up_to_date(self, inp, out, settings_digest):
+        """True if ``out`` was finished from this exact input and settings."""
+        rec = self.entries.get(Path(out).name)
+        if not rec or rec["status"] != "done" or rec["settings"] != settings_digest:
+            return False
+        try:
+            if {k: rec.get(k) for k in ("input", "input_size", "input_mtime_ns")} \
+                    != self._input_state(inp):
+                return False
+            size, mtime_ns = output_stat(out)
+        except OSError:
+            return False
+        if size != rec["output_size"]:
+            return False
+        # An untouched output is trusted; a touched one must still hash the same
+        return (mtime_ns == rec["output_mtime_ns"]
+                or file_checksum(out) == rec["checksum"])
@@ -0,0 +1,143 @@
+"""Rendition ladders: several sizes of one input from a single decode.
+
+One ffmpeg process decodes the input once and ``split``s the video into a
+branch per rendition, each scaled and encoded with its own rate. The
+renditions are written as separate MP4 files, or as HLS or DASH segments
+with a manifest listing them, all inside one output directory.
+"""
+from dataclasses import dataclass
+
+from engine import PROGRESS_ARGS, clip_range, hvc1_args, preset_args, quality_args
+
+STREAMING_FORMATS = ("hls", "dash")
+MANIFESTS = {"hls": "master.m3u8", "dash": "manifest.mpd"}
+# Segment length; keyframes are forced on segment boundaries so every
+# rendition can be switched between at the same points
+SEGMENT_SECONDS = 6
+# Settings a ladder has no use for, and the values that turn them off
+UNUSED_BY_LADDER = {"target_size": 0, "quality_target": 0, "stream_copy": False}
+
+
+@dataclass(frozen=True)
+class Rendition:
+    width: int
+    height: int
+    bitrate: int = 0  # kbit/s; 0 uses the settings' CRF or bitrate
+
+    @property
+    def name(self):
+        return f"{self.height}p"
+
+
+def parse_renditions(text):
+    """Renditions from "1920x1080:5000,1280x720:2800,640x360", tallest first.
+
+    Raises ValueError for a malformed list.
+    """
+    renditions = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        size, _, rate = part.strip().partition(":")
+        try:
+            w, h = map(int, size.lower().split("x"))
+            r = Rendition(w, h, int(rate) if rate else 0)
+        except ValueError:
+            raise ValueError(f"bad rendition {part.strip()!r}, expected WxH or WxH:KBPS")
+        if w <= 0 or h <= 0 or r.bitrate < 0:
+            raise ValueError(f"bad rendition {part.strip()!r}")
+        renditions.append(r)
+    if not renditions:
+        raise ValueError("no renditions given")
+    names = [r.name for r in renditions]
+    if len(set(names)) != len(names):
+        raise ValueError("renditions must have different heights")
+    return sorted(renditions, key=lambda r: r.height, reverse=True)
+
+
+def ladder_settings(settings):
+    """``settings`` with the options a rendition ladder ignores turned off."""
+    if not settings.renditions:
+        return settings
+    return settings.update(**UNUSED_BY_LADDER)
+
+
+def _video_args(settings, r, spec):
+    """Encoder options for rendition ``r``, applied to the stream(s) ``spec``."""
+    if r.bitrate:
+        rate = ["-b", f"{r.bitrate}k", "-maxrate", f"{r.bitrate}k",
+                "-bufsize", f"{r.bitrate * 2}k"]
+    elif settings.video_bitrate > 0:
+        rate = ["-b", f"{settings.video_bitrate}k"]
+    else:
+        rate = quality_args(settings.codec, settings.crf)
+    args = ["-c", settings.codec, *preset_args(settings.codec, settings.preset), *rate]
+    if settings.streaming:
+        args += ["-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})"]
+    # Options come in (name, value) pairs; point every name at ``spec``
+    args = [f"{a.split(':')[0]}:{spec}" if i % 2 == 0 else a for i, a in enumerate(args)]
+    return args + hvc1_args(settings.codec, spec)
+
+
+def _audio_args(settings):
+    args = ["-ac", "1"] if settings.mono else []
+    return args + ["-c:a", "aac", "-b:a", settings.audio_bitrate]
+
+
+def build_ladder_command(inp, settings, threads=0, has_audio=True):
+    """ffmpeg command encoding every rendition of ``inp`` in one process.
+
+    Outputs are named relative to the working directory, which should be
+    the (empty) output directory.
+    """
+    renditions = parse_renditions(settings.renditions)
+    if settings.streaming and settings.streaming not in STREAMING_FORMATS:
+        raise ValueError(f"unknown streaming format {settings.streaming!r}")
+    n = len(renditions)
+    _, length = clip_range(settings)
+    cmd = ["ffmpeg", "-y", "-v", "error"] + PROGRESS_ARGS
+    if settings.trim_start:
+        cmd += ["-ss", settings.trim_start]
+    if "videotoolbox" in settings.codec:
+        cmd += ["-hwaccel", "videotoolbox"]
+    cmd += ["-i", str(inp)]
+    graph = [f"[0:v:0]split={n}" + "".join(f"[v{i}]" for i in range(n))]
+    graph += [f"[v{i}]scale={r.width}:{r.height}[out{i}]" for i, r in enumerate(renditions)]
+    cmd += ["-filter_complex", ";".join(graph)]
+    trim = ["-t", f"{length:.3f}"] if length is not None else []
+    # Per-job thread budget so concurrent encodes don't oversubscribe
+    thread_args = ["-threads", str(threads)] if threads else []
+
+    if not settings.streaming:
+        for i, r in enumerate(renditions):
+            cmd += ["-map", f"[out{i}]"]
+            if has_audio:
+                cmd += ["-map", "0:a:0", *_audio_args(settings)]
+            cmd += [*_video_args(settings, r, "v"), "-pix_fmt", "yuv420p",
+                    *thread_args, *trim, f"{r.name}.mp4"]
+        return cmd
+
+    for i in range(n):
+        cmd += ["-map", f"[out{i}]"]
+    # HLS muxes audio into every variant; DASH keeps one shared audio track
+    audio_maps = (n if settings.streaming == "hls" else 1) if has_audio else 0
+    cmd += ["-map", "0:a:0"] * audio_maps
+    for i, r in enumerate(renditions):
+        cmd += _video_args(settings, r, f"v:{i}")
+    cmd += ["-pix_fmt", "yuv420p", *thread_args, *trim]
+    if audio_maps:
+        cmd += _audio_args(settings)
+    if settings.streaming == "hls":
+        streams = [f"v:{i}" + (f",a:{i}" if has_audio else "") + f",name:{r.name}"
+                   for i, r in enumerate(renditions)]
+        cmd += ["-f", "hls", "-hls_time", str(SEGMENT_SECONDS),
+                "-hls_playlist_type", "vod", "-hls_segment_type", "fmp4",
+                "-hls_segment_filename", "%v/seg_%05d.m4s",
+                "-master_pl_name", MANIFESTS["hls"],
+                "-var_stream_map", " ".join(streams), "%v/index.m3u8"]
+    else:
+        sets = "id=0,streams=v" + (" id=1,streams=a" if has_audio else "")
+        cmd += ["-f", "dash", "-seg_duration", str(SEGMENT_SECONDS),
+                "-use_template", "1", "-use_timeline", "1",
+                "-adaptation_sets", sets, MANIFESTS["dash"]]
+    return cmd
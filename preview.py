@@ -0,0 +1,88 @@
+"""Live preview frames tapped from the running encode.
+
+Instead of a second ffmpeg seeking into the source, the encode itself gets a
+second, tiny output: a few raw RGB frames per minute, scaled and padded to a
+fixed size and written to an inherited pipe. Decoded frames are shared with
+the main output, so the only extra work is a small scale per preview frame.
+"""
+import os
+import threading
+
+PREVIEW_WIDTH = 240
+PREVIEW_HEIGHT = 136
+# One preview frame per this many seconds of video
+PREVIEW_INTERVAL = 2.0
+FRAME_BYTES = PREVIEW_WIDTH * PREVIEW_HEIGHT * 3
+
+# ffmpeg can only write to an inherited descriptor where Popen supports pass_fds
+SUPPORTED = os.name == "posix"
+
+
+def preview_output_args(fd, length=None):
+    """Extra ffmpeg output writing preview frames to file descriptor ``fd``.
+
+    ``length`` must repeat the main output's ``-t`` since output options
+    don't carry over to the next output.
+    """
+    w, h = PREVIEW_WIDTH, PREVIEW_HEIGHT
+    args = ["-map", "0:v:0", "-an", "-sn"]
+    if length is not None:
+        args += ["-t", f"{length:.3f}"]
+    return args + [
+        "-vf", (f"fps=1/{PREVIEW_INTERVAL},"
+                f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2"),
+        "-pix_fmt", "rgb24", "-f", "rawvideo", f"pipe:{fd}",
+    ]
+
+
+class PreviewSink:
+    """Holds the most recent preview frame in a fixed, reused buffer.
+
+    While ``active`` is False (e.g. the window is hidden) frames are dropped
+    without being copied.
+    """
+
+    def __init__(self):
+        self.active = True
+        self.job = None
+        self.seq = 0
+        self._buf = bytearray(FRAME_BYTES)
+        self._lock = threading.Lock()
+
+    def push(self, job, frame):
+        if not self.active:
+            return
+        with self._lock:
+            self._buf[:] = frame
+            self.job = job
+            self.seq += 1
+
+    def ppm(self):
+        """The latest frame as binary PPM, which Tk's PhotoImage reads directly."""
+        header = b"P6 %d %d 255\n" % (PREVIEW_WIDTH, PREVIEW_HEIGHT)
+        with self._lock:
+            return header + self._buf
+
+
+class PreviewReader(threading.Thread):
+    """Reads fixed-size frames from the preview pipe into one reused buffer."""
+
+    def __init__(self, fd, job, sink):
+        super().__init__(daemon=True)
+        self.file = os.fdopen(fd, "rb", buffering=0)
+        self.job = job
+        self.sink = sink
+        self.buf = bytearray(FRAME_BYTES)
+
+    def run(self):
+        view = memoryview(self.buf)
+        with self.file:
+            while True:
+                n = 0
+                while n < FRAME_BYTES:
+                    r = self.file.readinto(view[n:])
+                    if not r:
+                        return
+                    n += r
+                self.sink.push(self.job, self.buf)
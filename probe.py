@@ -0,0 +1,175 @@
+"""ffprobe metadata, probed once per file and kept in an on-disk index."""
+import json
+import os
+import queue
+import sqlite3
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Background probes run by warm_later(), however many paths are queued
+WARM_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "video_compressor"
+
+
+def run_ffprobe(path):
+    """Single ffprobe call returning the parsed format and stream info."""
+    out = subprocess.check_output([
+        "ffprobe", "-v", "error", "-print_format", "json",
+        "-show_format", "-show_streams", str(path)
+    ], text=True)
+    return json.loads(out)
+
+
+class MediaInfo:
+    """Convenience accessors over the raw ffprobe JSON."""
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def format(self):
+        return self.data.get("format", {})
+
+    @property
+    def streams(self):
+        return self.data.get("streams", [])
+
+    def stream(self, kind):
+        """First stream of the given codec_type ("video", "audio"), or None."""
+        for s in self.streams:
+            if s.get("codec_type") == kind:
+                return s
+        return None
+
+    @property
+    def duration(self):
+        for src in (self.format, self.stream("video") or {}):
+            try:
+                return float(src["duration"])
+            except (KeyError, ValueError):
+                pass
+        return 0.0
+
+    @property
+    def size(self):
+        v = self.stream("video")
+        if not v:
+            return None
+        return int(v["width"]), int(v["height"])
+
+    @property
+    def audio_channels(self):
+        a = self.stream("audio")
+        return int(a.get("channels", 0)) if a else 0
+
+
+class ProbeCache:
+    """ffprobe results keyed by path, size and mtime, stored in SQLite.
+
+    A cached entry is only used while the file's size and mtime still match
+    what was recorded, so edited or replaced files are probed again.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = cache_dir() / "probe.sqlite3"
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error):
+            # Unwritable cache location: still avoid re-probing this session
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        # Paths queued by warm_later(), created with its workers on first use
+        self._warm_queue = None
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS probe ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data TEXT)")
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def lookup(self, path):
+        """Cached MediaInfo for an unchanged file, without probing; else None."""
+        key = self._key(path)
+        st = os.stat(key)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, data FROM probe WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return MediaInfo(json.loads(row[2]))
+        return None
+
+    def get(self, path):
+        """MediaInfo for ``path``, probing only if the cache is stale."""
+        info = self.lookup(path)
+        if info is not None:
+            return info
+        key = self._key(path)
+        st = os.stat(key)
+        data = run_ffprobe(key)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO probe (path, size, mtime_ns, data) VALUES (?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, json.dumps(data)))
+        return MediaInfo(data)
+
+    def invalidate(self, path):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM probe WHERE path = ?", (self._key(path),))
+
+    def _try_get(self, p):
+        try:
+            return p, self.get(p)
+        except (OSError, subprocess.CalledProcessError, ValueError) as e:
+            return p, e
+
+    def warm(self, paths, workers=None):
+        """Probe many files concurrently; returns ``{path: MediaInfo or exception}``."""
+        workers = workers or min(32, (os.cpu_count() or 1) * 2)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(pool.map(self._try_get, paths))
+
+    def warm_later(self, paths):
+        """Queues ``paths`` to be probed in the background and returns at once.
+
+        All calls share WARM_WORKERS daemon threads, so streaming in many
+        batches never runs more ffprobes than that at a time.
+        """
+        with self._lock:
+            if self._warm_queue is None:
+                self._warm_queue = queue.Queue()
+                for _ in range(WARM_WORKERS):
+                    threading.Thread(target=self._warm_worker, daemon=True).start()
+        for p in paths:
+            self._warm_queue.put(p)
+
+    def _warm_worker(self):
+        while True:
+            self._try_get(self._warm_queue.get())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Process-wide cache in the user's cache directory."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ProbeCache()
+        return _default
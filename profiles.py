@@ -0,0 +1,96 @@
+"""Named settings profiles stored on disk, and bulk edits over many files.
+
+A profile is a named EncodeSettings kept in profiles.json in the config
+directory. Files in a batch map to shared, immutable settings objects, so
+applying a profile to thousands of files stores one object, and a field
+change is computed once per distinct settings rather than once per file.
+"""
+import fnmatch
+import json
+import os
+import threading
+from dataclasses import fields
+from pathlib import Path
+
+from engine import EncodeSettings, intern_settings
+
+
+def config_dir():
+    base = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+    return Path(base) / "video_compressor"
+
+
+class ProfileStore:
+    def __init__(self, path=None):
+        self.path = Path(path) if path else config_dir() / "profiles.json"
+        self._lock = threading.Lock()
+        self.profiles = {}
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        for name, d in data.items():
+            self.profiles[name] = EncodeSettings.from_dict(d)
+
+    def names(self):
+        return sorted(self.profiles)
+
+    def get(self, name):
+        """The profile's settings; raises KeyError for an unknown name."""
+        return self.profiles[name]
+
+    def save(self, name, settings):
+        with self._lock:
+            self.profiles[name] = intern_settings(settings)
+            self._write()
+
+    def delete(self, name):
+        with self._lock:
+            if self.profiles.pop(name, None) is not None:
+                self._write()
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(
+            {name: s.to_dict() for name, s in sorted(self.profiles.items())}, indent=2))
+        os.replace(tmp, self.path)
+
+
+def parse_field(name, text):
+    """``text`` converted to the type of the EncodeSettings field ``name``.
+
+    Raises ValueError for an unknown field or a value of the wrong type.
+    """
+    types = {f.name: f.type for f in fields(EncodeSettings)}
+    if name not in types:
+        raise ValueError(f"unknown setting {name!r}")
+    if types[name] is bool:
+        return text.strip().lower() in ("1", "true", "yes", "on")
+    return types[name](text.strip())
+
+
+def matching(paths, pattern):
+    """The paths whose file name matches the glob ``pattern``."""
+    return [p for p in paths if fnmatch.fnmatch(Path(p).name, pattern)]
+
+
+def apply_profile(file_settings, paths, settings):
+    """Points every path at the same ``settings`` object."""
+    settings = intern_settings(settings)
+    for p in paths:
+        file_settings[p] = settings
+
+
+def apply_changes(file_settings, paths, **changes):
+    """Applies field ``changes`` to the settings of every path.
+
+    Paths sharing a settings object keep sharing the updated one. Raises
+    TypeError for an unknown field.
+    """
+    updated = {}
+    for p in paths:
+        old = file_settings[p]
+        if old not in updated:
+            updated[old] = old.update(**changes)
+        file_settings[p] = updated[old]
@@ -0,0 +1,192 @@
+"""Machine-readable ffmpeg progress and a small event stream to publish it.
+
+ffmpeg is run with ``-progress pipe:1`` which writes ``key=value`` lines to
+stdout, one block per update ending in ``progress=continue`` (or ``end``).
+A ProgressReader thread turns those blocks into ProgressEvents and publishes
+them on an EventBus that the GUI, the CLI and log sinks subscribe to.
+"""
+import collections
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+# Appended to every ffmpeg command whose progress we want to follow
+PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class ProgressEvent:
+    job: object
+    status: str = "progress"  # "progress" while running, "end" when ffmpeg is done
+    out_time: float = 0.0     # seconds of output written
+    duration: float = 0.0     # expected output length in seconds, 0 if unknown
+    frame: int = 0            # frames encoded so far
+    fps: float = 0.0
+    speed: float = 0.0        # realtime multiplier
+    total_size: int = 0       # bytes written so far
+    bitrate: float = 0.0      # kbit/s
+
+    @property
+    def done(self):
+        return self.status == "end"
+
+    @property
+    def percent(self):
+        if self.done:
+            return 100.0
+        if self.duration > 0:
+            return min(self.out_time / self.duration * 100, 100.0)
+        return 0.0
+
+
+def _number(value, suffix=""):
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0  # "N/A" before the first frame
+
+
+def parse_progress(lines):
+    """Yield one dict per ``-progress`` block from an iterable of lines."""
+    block = {}
+    for line in lines:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            continue
+        block[key] = value
+        if key == "progress":
+            yield block
+            block = {}
+
+
+def event_from_block(job, block, duration=0.0):
+    # out_time_ms is also in microseconds, kept for older ffmpeg builds
+    us = block.get("out_time_us", block.get("out_time_ms", "0"))
+    return ProgressEvent(
+        job=job,
+        status="end" if block.get("progress") == "end" else "progress",
+        out_time=max(_number(us) / 1_000_000, 0.0),
+        duration=duration,
+        frame=int(_number(block.get("frame", "0"))),
+        fps=_number(block.get("fps", "0")),
+        speed=_number(block.get("speed", "0"), "x"),
+        total_size=int(_number(block.get("total_size", "0"))),
+        bitrate=_number(block.get("bitrate", "0"), "kbits/s"),
+    )
+
+
+class EventBus:
+    """Fan-out of ProgressEvents to any number of subscribers.
+
+    Callbacks run on the publishing thread, so GUI subscribers should only
+    stash the event and render it from their own event loop.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, interval=None):
+        """Register ``callback(event)``; returns a function that unsubscribes.
+
+        With ``interval`` the callback is rate limited: updates for the same
+        job are coalesced and at most one batch is delivered per interval.
+        """
+        if interval:
+            callback = Coalescer(callback, interval)
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for cb in subscribers:
+            try:
+                cb(event)
+            except Exception:
+                log.exception("progress subscriber failed")
+
+
+class Coalescer:
+    """Keeps the latest event per job and forwards them at most every ``interval``.
+
+    Final ("end") events are always delivered straight away so nothing is
+    lost when a job finishes between flushes.
+    """
+
+    def __init__(self, callback, interval):
+        self.callback = callback
+        self.interval = interval
+        self._pending = {}
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            self._pending[id(event.job)] = event
+            now = time.monotonic()
+            if not event.done and now - self._last < self.interval:
+                return
+            self._last = now
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for ev in pending:
+            self.callback(ev)
+
+
+class ProgressReader(threading.Thread):
+    """Reads ``-progress pipe:1`` output from a process and publishes events."""
+
+    def __init__(self, stream, job, bus, duration=0.0, offset=0.0, final=True):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.job = job
+        self.bus = bus
+        self.duration = duration
+        # Added to out_time when one job runs several passes
+        self.offset = offset
+        # False for an early pass: its "end" is not the end of the job
+        self.final = final
+        self.last = None
+
+    def run(self):
+        for block in parse_progress(self.stream):
+            self.last = event_from_block(self.job, block, self.duration)
+            self.last.out_time += self.offset
+            if not self.final:
+                self.last.status = "progress"
+            self.bus.publish(self.last)
+
+
+def drain(stream, maxlen=20):
+    """Consume a stream on a thread, keeping only its last lines (for errors)."""
+    tail = collections.deque(maxlen=maxlen)
+
+    def run():
+        for line in stream:
+            tail.append(line.rstrip())
+    threading.Thread(target=run, daemon=True).start()
+    return tail
+
+
+def log_sink(logger=log, interval=5.0):
+    """Subscriber that writes a progress line per job at most every ``interval``."""
+    def write(event):
+        key = getattr(event.job, "key", event.job)
+        logger.info("[%s] %s fps=%.1f speed=%.2fx size=%d bitrate=%.1fk",
+                    "done" if event.done else f"{event.percent:5.1f}%",
+                    getattr(key, "name", key), event.fps, event.speed,
+                    event.total_size, event.bitrate)
+    return Coalescer(write, interval)
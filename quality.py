@@ -0,0 +1,64 @@
+"""Objective quality of an encode against its source using ffmpeg's filters."""
+import functools
+import re
+import subprocess
+
+METRICS = ("ssim", "psnr", "vmaf")
+
+_PATTERNS = {
+    "ssim": re.compile(r"SSIM .*All:([\d.]+)"),
+    "psnr": re.compile(r"PSNR .*average:([\d.]+|inf)"),
+    "vmaf": re.compile(r"VMAF score[:=]\s*([\d.]+)"),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def available_metrics():
+    """Metrics this ffmpeg build can compute (VMAF needs --enable-libvmaf)."""
+    try:
+        out = subprocess.check_output(
+            ["ffmpeg", "-hide_banner", "-filters"], text=True, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return ()
+    names = {line.split()[1] for line in out.splitlines() if len(line.split()) > 1}
+    return tuple(m for m in METRICS if ("libvmaf" if m == "vmaf" else m) in names)
+
+
+def measure(distorted, reference, metrics=("ssim",), size=None, ref_args=(), threads=0):
+    """Scores ``distorted`` against ``reference`` in a single decode of each.
+
+    ``size`` ("WxH") scales the reference to the encode's resolution first;
+    ``ref_args`` are input options for the reference (e.g. ``-ss``/``-t`` to
+    compare a sampled segment). Returns ``{metric: score}``, SSIM as 0-1,
+    PSNR in dB and VMAF as 0-100.
+    """
+    metrics = [m for m in metrics if m in METRICS]
+    if not metrics:
+        return {}
+    n = len(metrics)
+    ref_chain = "setpts=PTS-STARTPTS"
+    if size:
+        ref_chain += f",scale={size.replace('x', ':')}:flags=bicubic"
+    refs = "".join(f"[r{i}]" for i in range(n))
+    graph = [f"[1:v]{ref_chain},split={n}{refs}" if n > 1 else f"[1:v]{ref_chain}[r0]",
+             "[0:v]setpts=PTS-STARTPTS[d0]"]
+    # Each metric filter passes its first input through, so they chain
+    for i, m in enumerate(metrics):
+        name = "libvmaf" if m == "vmaf" else m
+        out = f"[d{i + 1}]" if i < n - 1 else ""
+        graph.append(f"[d{i}][r{i}]{name}{out}")
+    cmd = ["ffmpeg", "-hide_banner", "-nostdin"]
+    if threads:
+        cmd += ["-filter_complex_threads", str(threads)]
+    cmd += ["-i", str(distorted), *ref_args, "-i", str(reference),
+            "-lavfi", ";".join(graph), "-f", "null", "-"]
+    res = subprocess.run(cmd, capture_output=True, text=True, errors="replace")
+    if res.returncode != 0:
+        lines = res.stderr.strip().splitlines()
+        raise RuntimeError(f"quality measurement failed: {lines[-1] if lines else res.returncode}")
+    scores = {}
+    for m in metrics:
+        found = _PATTERNS[m].findall(res.stderr)
+        if found:
+            scores[m] = float(found[-1])
+    return scores
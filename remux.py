@@ -0,0 +1,136 @@
+"""Stream-copy fast path for sources that already meet the settings.
+
+Each stream is checked against the settings on its own. Video already in
+the target codec family, no larger than the target resolution and no
+higher in bitrate is copied, so the file is remuxed in seconds and without
+another generation of loss. Audio is decided separately, so e.g. a mono
+downmix re-encodes only the audio. A copied video stream can only start on
+a keyframe, so a trim start is moved back to the previous keyframe when
+one is close enough; otherwise the video is re-encoded.
+"""
+import subprocess
+from dataclasses import replace
+
+from chunked import keyframe_times
+from engine import (CODEC_FAMILY, clip_duration, clip_range, log, parse_bitrate,
+                    target_video_bitrate)
+
+# Bits per pixel per frame above which a CRF-mode source is worth re-encoding
+MAX_COPY_BPP = 0.1
+# A copied stream may start at most this much before the requested trim start
+KEYFRAME_TOLERANCE = 0.5
+# Container-reported bitrates are approximate
+RATE_SLACK = 1.1
+
+
+def frame_rate(stream):
+    num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def stream_bitrate(info, kind):
+    """Bits per second of the first ``kind`` stream, 0 if unknown.
+
+    Falls back to the whole file's rate minus the audio for video streams,
+    as Matroska doesn't record per-stream rates.
+    """
+    stream = info.stream(kind)
+    try:
+        return float(stream["bit_rate"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    if kind != "video":
+        return 0.0
+    try:
+        total = float(info.format["bit_rate"])
+    except (KeyError, ValueError):
+        return 0.0
+    return max(total - stream_bitrate(info, "audio"), 0.0)
+
+
+def video_reason(info, settings, length):
+    """Why the video has to be re-encoded, or None if it can be copied."""
+    v = info.stream("video")
+    if v.get("codec_name") != CODEC_FAMILY.get(settings.codec):
+        return f"codec {v.get('codec_name')} is not {settings.codec}"
+    if v.get("pix_fmt") != "yuv420p":
+        return f"pixel format {v.get('pix_fmt')}"
+    try:
+        max_w, max_h = map(int, settings.resolution.lower().split("x"))
+    except ValueError:
+        return f"resolution {settings.resolution}"
+    w, h = info.size
+    if w > max_w or h > max_h:
+        return f"{w}x{h} is larger than {settings.resolution}"
+    rate = stream_bitrate(info, "video")
+    if not rate:
+        return "unknown bitrate"
+    if settings.target_size > 0:
+        try:
+            limit = target_video_bitrate(settings.target_size * 1024 * 1024, length,
+                                         settings.audio_bitrate) * 1000
+        except ValueError as e:
+            return str(e)
+    elif settings.video_bitrate > 0:
+        limit = settings.video_bitrate * 1000 * RATE_SLACK
+    else:
+        limit = w * h * frame_rate(v) * MAX_COPY_BPP
+    if rate > limit:
+        return f"{rate / 1000:.0f} kbit/s is over {limit / 1000:.0f} kbit/s"
+    return None
+
+
+def audio_reason(info, settings):
+    """Why the audio has to be re-encoded, or None if it can be copied."""
+    a = info.stream("audio")
+    if a.get("codec_name") != "aac":
+        return f"codec {a.get('codec_name')} is not aac"
+    if settings.mono and info.audio_channels != 1:
+        return "downmix to mono"
+    rate = stream_bitrate(info, "audio")
+    if not rate or rate > parse_bitrate(settings.audio_bitrate) * RATE_SLACK:
+        return "bitrate over the target"
+    return None
+
+
+def keyframe_start(path, start):
+    """Latest keyframe at most KEYFRAME_TOLERANCE before ``start``, or None."""
+    try:
+        keyframes = keyframe_times(path, max(start - KEYFRAME_TOLERANCE, 0), start)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    before = [t for t in keyframes if start - KEYFRAME_TOLERANCE <= t <= start]
+    return max(before) if before else None
+
+
+def plan_copy(path, info, settings):
+    """Which streams of ``path`` can be copied under ``settings``.
+
+    Returns ``(copy, settings)``: the set of stream kinds to copy, and the
+    settings to encode with, whose trim start may have moved to a keyframe.
+    """
+    copy = set()
+    if info.stream("video") is not None:
+        length = clip_duration(info.duration, settings)
+        reason = video_reason(info, settings, length) if length > 0 else "unknown duration"
+        start, _ = clip_range(settings)
+        if reason is None and start > 0:
+            kf = keyframe_start(path, start)
+            if kf is None:
+                reason = "no keyframe at the trim start"
+            elif kf < start:
+                settings = replace(settings, trim_start=f"{kf:.6f}")
+        if reason is None:
+            copy.add("video")
+        else:
+            log.debug("%s: re-encoding video: %s", path, reason)
+    if info.stream("audio") is not None:
+        reason = audio_reason(info, settings)
+        if reason is None:
+            copy.add("audio")
+        else:
+            log.debug("%s: re-encoding audio: %s", path, reason)
+    return copy, settings
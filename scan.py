@@ -0,0 +1,121 @@
+"""Folder scanning for input files.
+
+Directories are walked with ``os.scandir`` so file type checks come from the
+directory entry rather than an extra stat each. Files are identified by
+``(st_dev, st_ino)``, which catches the same file reached through a symlink
+or a second selected folder, and also stops symlink loops.
+"""
+import fnmatch
+import os
+import queue
+import threading
+from pathlib import Path
+
+BATCH_SIZE = 500
+
+
+def file_key(path):
+    """Identity of a file across different paths to it."""
+    st = os.stat(path)
+    return st.st_dev, st.st_ino
+
+
+def _matches(name, extensions, include, exclude):
+    if extensions and os.path.splitext(name)[1].lower() not in extensions:
+        return False
+    if include and not any(fnmatch.fnmatch(name, p) for p in include):
+        return False
+    return not any(fnmatch.fnmatch(name, p) for p in exclude)
+
+
+def scan(paths, recursive=False, extensions=(), include=(), exclude=(), seen=None,
+         cancel_event=None):
+    """Yields ``(path, key)`` for matching files under ``paths``.
+
+    Files named directly are always yielded (with a None key if they can't
+    be stat'ed). Files inside directories must have one of ``extensions``
+    (lowercase, with the dot, empty for any), match one of the ``include``
+    globs if given and none of the ``exclude`` globs.
+    ``seen`` is a set of file keys already known, updated as files are found.
+    Hidden entries are skipped inside directories.
+    """
+    seen = set() if seen is None else seen
+    visited = set()
+    for p in map(Path, paths):
+        try:
+            key = file_key(p)
+        except OSError:
+            # Let the caller report it the way it reports any unreadable input
+            yield p, None
+            continue
+        if not p.is_dir():
+            if key not in seen:
+                seen.add(key)
+                yield p, key
+            continue
+        # Walk depth-first, one directory's entries in name order at a time
+        pending = [(p, key)]
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            d, dkey = pending.pop()
+            if dkey in visited:
+                continue
+            visited.add(dkey)
+            try:
+                with os.scandir(d) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for e in entries:
+                if e.name.startswith("."):
+                    continue
+                try:
+                    if e.is_dir():
+                        if recursive:
+                            st = e.stat()
+                            subdirs.append((Path(e.path), (st.st_dev, st.st_ino)))
+                        continue
+                    if not e.is_file() or not _matches(e.name, extensions, include, exclude):
+                        continue
+                    st = e.stat()
+                except OSError:
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key not in seen:
+                    seen.add(key)
+                    yield Path(e.path), key
+            pending.extend(reversed(subdirs))
+
+
+class Scanner(threading.Thread):
+    """Runs ``scan`` in the background, handing results over in batches.
+
+    The consumer polls ``batches`` (lists of ``(path, key)``); None marks the
+    end of the scan.
+    """
+
+    def __init__(self, paths, batch_size=BATCH_SIZE, **kwargs):
+        super().__init__(daemon=True)
+        self.paths = paths
+        self.batch_size = batch_size
+        self.kwargs = kwargs
+        self.batches = queue.Queue()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        batch = []
+        try:
+            for item in scan(self.paths, cancel_event=self.cancel_event, **self.kwargs):
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self.batches.put(batch)
+                    batch = []
+        finally:
+            if batch:
+                self.batches.put(batch)
+            self.batches.put(None)
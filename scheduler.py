@@ -0,0 +1,320 @@
+"""Concurrent job scheduler used to run several ffmpeg encodes at once."""
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# Roughly how many threads each encoder keeps busy at mobile resolutions.
+# Past this point the encoder stops scaling, so spare cores are better spent
+# on another concurrent job than on more threads for the same one.
+CODEC_THREADS = {
+    "libx265": 4,
+    "libx264": 6,
+    "libsvtav1": 8,
+    "hevc_videotoolbox": 2,
+    "h264_videotoolbox": 2,
+    "hevc_nvenc": 2,
+    "h264_nvenc": 2,
+    "hevc_qsv": 2,
+    "h264_qsv": 2,
+}
+DEFAULT_CODEC_THREADS = 4
+# Hardware encoders only expose a couple of concurrent sessions.
+HW_SESSION_LIMIT = 2
+# How often jobs held back by the admission hook are reconsidered while
+# nothing finishes (conditions like free disk space change on their own)
+ADMIT_RETRY = 2.0
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+def cpu_count():
+    """Number of CPUs this process may actually run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def is_hw_codec(codec):
+    return codec.endswith(("_videotoolbox", "_nvenc", "_qsv"))
+
+
+def auto_workers(codecs, cpus=None):
+    """Pick a worker count from the CPU count and the codecs in the queue."""
+    cpus = cpus or cpu_count()
+    codecs = set(codecs) or {"libx265"}
+    per_job = max(CODEC_THREADS.get(c, DEFAULT_CODEC_THREADS) for c in codecs)
+    workers = max(1, cpus // per_job)
+    if all(is_hw_codec(c) for c in codecs):
+        workers = min(workers, HW_SESSION_LIMIT)
+    return workers
+
+
+def threads_per_job(workers, cpus=None):
+    """Split the CPU budget evenly so concurrent jobs don't oversubscribe."""
+    cpus = cpus or cpu_count()
+    return max(1, cpus // max(1, workers))
+
+
+class Job:
+    """A single queued encode with its own progress, pause and cancel state.
+
+    ``priority`` orders the queue: lower values start first, ties keep
+    submission order.
+    """
+
+    def __init__(self, key, duration=0.0, priority=0, data=None):
+        self.key = key
+        # Seconds of progress the job reports; grows with extra passes
+        self.duration = duration
+        # Seconds of video the job encodes, however many passes it takes
+        self.media_duration = 0.0
+        self.priority = priority
+        self.data = data
+        self.threads = 0
+        # Where the job writes, if the one submitting it decides that
+        self.output = None
+        self.state = QUEUED
+        self.position = 0.0
+        self.error = None
+        # Set by run_job when there turned out to be nothing to do
+        self.skipped = False
+        # Resources used by the job's child processes, where the OS reports them
+        self.cpu_time = 0.0
+        self.peak_rss = 0
+        # Frames encoded, as reported by the longest ffmpeg pass
+        self.frames = 0
+        self.started = None
+        self.finished = None
+        self.pause_event = threading.Event()
+        self.pause_event.set()
+        self.cancel_event = threading.Event()
+
+    @property
+    def paused(self):
+        return not self.pause_event.is_set()
+
+    @property
+    def fraction(self):
+        if self.state in FINISHED_STATES:
+            return 1.0
+        if self.duration > 0:
+            return min(self.position / self.duration, 1.0)
+        return 0.0
+
+    def update(self, position):
+        self.position = max(0.0, position)
+
+    def pause(self):
+        self.pause_event.clear()
+
+    def resume(self):
+        self.pause_event.set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        # Wake a paused job so it can notice the cancellation.
+        self.pause_event.set()
+
+
+class JobScheduler:
+    """Runs queued jobs on a fixed pool of worker threads.
+
+    ``run_job(job)`` does the actual work and should raise on failure; it is
+    expected to call ``job.update()`` as it goes so the scheduler can report
+    combined progress across everything that is running.
+    """
+
+    def __init__(self, run_job, workers=1, on_finish=None, admit=None, keep_finished=True,
+                 on_exit=None):
+        self.run_job = run_job
+        # Called once the last worker has exited after close()
+        self.on_exit = on_exit
+        # False drops jobs from ``jobs`` once finished, for long-running use
+        self.keep_finished = keep_finished
+        # Called with each job once it has left the running state
+        self.on_finish = on_finish
+        # admit(job) is called under the scheduler lock just before a job
+        # would start: True starts it, False holds it back for now and an
+        # exception fails it. Held jobs are retried as others finish.
+        self.admit = admit
+        self.workers = max(1, workers)
+        self.jobs = []
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._live_workers = 0
+        self._closed = False
+        self._started_at = None
+        self.pause_event = threading.Event()
+        self.pause_event.set()
+        self.cancel_event = threading.Event()
+
+    def submit(self, job):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            self.jobs.append(job)
+            heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def start(self):
+        self._started_at = time.time()
+        self._live_workers = self.workers
+        for _ in range(self.workers):
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def close(self):
+        """No more jobs will be submitted; workers exit once the queue drains."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def is_active(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def pause_all(self):
+        self.pause_event.clear()
+        for job in self.jobs:
+            job.pause()
+
+    def resume_all(self):
+        self.pause_event.set()
+        for job in self.jobs:
+            job.resume()
+
+    def cancel_all(self):
+        self.cancel_event.set()
+        self.pause_event.set()
+        with self._cond:
+            for job in self.jobs:
+                if job.state == QUEUED:
+                    job.state = CANCELLED
+                job.cancel()
+            self._cond.notify_all()
+
+    def cancel(self, job):
+        with self._cond:
+            if job.state == QUEUED:
+                job.state = CANCELLED
+        job.cancel()
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                job, held = self._pop_admitted()
+                for entry in held:
+                    heapq.heappush(self._heap, entry)
+                if job is not None:
+                    job.state = RUNNING
+                    return job
+                if (self._closed and not held) or self.cancel_event.is_set():
+                    return None
+                self._cond.wait(ADMIT_RETRY if held else None)
+
+    def _pop_admitted(self):
+        """Pops the first job the admission hook lets start, and the heap
+        entries it held back on the way."""
+        held = []
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            job = entry[2]
+            if job.state != QUEUED:
+                continue
+            if self.admit is None:
+                return job, held
+            try:
+                admitted = self.admit(job)
+            except Exception as e:
+                job.error = e
+                job.state = FAILED
+                job.finished = time.time()
+                if self.on_finish:
+                    self.on_finish(job)
+                self._forget(job)
+                continue
+            if admitted:
+                return job, held
+            held.append(entry)
+        return None, held
+
+    def _worker(self):
+        while True:
+            # Don't start anything new while the whole batch is paused.
+            while not self.pause_event.wait(0.1):
+                pass
+            job = self._next_job()
+            if job is None:
+                self._worker_exited()
+                return
+            job.started = time.time()
+            try:
+                self.run_job(job)
+            except Exception as e:
+                job.error = e
+                job.state = FAILED
+            else:
+                job.state = CANCELLED if job.cancel_event.is_set() else DONE
+            job.finished = time.time()
+            if self.on_finish:
+                self.on_finish(job)
+            with self._cond:
+                self._forget(job)
+                # Jobs held back by admission may fit now
+                self._cond.notify_all()
+
+    def _worker_exited(self):
+        with self._cond:
+            self._live_workers -= 1
+            last = self._live_workers == 0
+        if last and self.on_exit:
+            self.on_exit()
+
+    def _forget(self, job):
+        if not self.keep_finished:
+            self.jobs.remove(job)
+
+    def running(self):
+        return [j for j in self.jobs if j.state == RUNNING]
+
+    def progress(self):
+        """Combined progress of the batch as ``(done, total, eta)``.
+
+        ``done`` and ``total`` are in media seconds; jobs whose duration is
+        not known yet are counted at the average of the known ones. ``eta``
+        is in wall seconds, or None until there is enough to go on.
+        """
+        # Skipped jobs finish instantly and would skew the rate
+        jobs = [j for j in self.jobs
+                if not j.skipped and not (j.state == CANCELLED and j.started is None)]
+        known = [j.duration for j in jobs if j.duration > 0]
+        avg = sum(known) / len(known) if known else 0.0
+        total = done = 0.0
+        for j in jobs:
+            d = j.duration if j.duration > 0 else avg
+            total += d
+            done += d * j.fraction
+        eta = None
+        if self._started_at and done > 0:
+            rate = done / max(time.time() - self._started_at, 1e-6)
+            eta = max(total - done, 0.0) / rate
+        return done, total, eta
+
+    def counts(self):
+        finished = sum(1 for j in self.jobs if j.state in FINISHED_STATES)
+        return finished, len(self.jobs)
@@ -0,0 +1,174 @@
+"""Per-job performance metrics: a JSONL log and an optional /metrics endpoint.
+
+Every finished job appends one JSON line with its settings, wall time,
+encode fps and speed, CPU time and peak RSS of its ffmpeg processes, and
+bytes in versus out. The same numbers are summed into counters which a
+small HTTP server can expose in the Prometheus text format, together with
+gauges for the jobs running right now.
+"""
+import collections
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from journal import output_size
+from probe import cache_dir
+from scheduler import DONE
+
+PREFIX = "video_compressor"
+
+
+@dataclass
+class JobMetrics:
+    time: float
+    input: str
+    output: str
+    status: str
+    codec: str
+    preset: str
+    resolution: str
+    rate: str            # "crf=28", "2000k", "target=25MB", ...
+    media_s: float       # seconds of video encoded
+    wall_s: float
+    frames: int
+    fps: float           # frames per wall second over the whole job
+    speed: float         # media seconds per wall second
+    cpu_s: float
+    peak_rss: int        # bytes
+    bytes_in: int
+    bytes_out: int
+    ratio: float         # bytes_out / bytes_in, 0 if unknown
+    error: str = ""
+
+
+def _rate(settings):
+    if settings.target_size > 0:
+        return f"target={settings.target_size:g}MB"
+    if settings.video_bitrate > 0:
+        return f"{settings.video_bitrate}k"
+    return f"crf={settings.crf}"
+
+
+def job_metrics(job, out):
+    """Metrics of a finished job writing ``out``."""
+    settings = job.data
+    finished = job.finished or time.time()
+    # Jobs failed before they ran (e.g. by admission) never started
+    wall = finished - job.started if job.started is not None else 0.0
+    frames = job.frames
+    # Rates only mean something for a finished encode
+    done = job.state == DONE and wall > 0
+    # The whole input, even when only a trimmed part of it is encoded
+    bytes_in = output_size(job.key)
+    bytes_out = output_size(out) if job.state == DONE else 0
+    return JobMetrics(
+        time=finished, input=str(job.key), output=str(out),
+        status=job.state, codec=settings.codec, preset=settings.preset,
+        resolution=settings.renditions or settings.resolution, rate=_rate(settings),
+        media_s=round(job.media_duration, 3), wall_s=round(wall, 3), frames=frames,
+        fps=round(frames / wall, 2) if done else 0.0,
+        speed=round(job.media_duration / wall, 3) if done else 0.0,
+        cpu_s=round(job.cpu_time, 3), peak_rss=job.peak_rss,
+        bytes_in=bytes_in, bytes_out=bytes_out,
+        ratio=round(bytes_out / bytes_in, 4) if bytes_in and bytes_out else 0.0,
+        error=str(job.error or ""))
+
+
+class Telemetry:
+    """Collects JobMetrics into a JSONL file and running totals.
+
+    ``on_progress`` subscribes to the encoder's event bus for the live
+    gauges; ``record(job, out)`` is called once per finished job.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else cache_dir() / "metrics.jsonl"
+        self._lock = threading.Lock()
+        self.jobs = collections.Counter()        # (codec, status) -> count
+        self.totals = collections.defaultdict(float)
+        self.peak_rss = 0
+        # Latest progress event per running job, for the live gauges
+        self.live = {}
+
+    def on_progress(self, event):
+        with self._lock:
+            if event.done:
+                self.live.pop(event.job, None)
+            else:
+                self.live[event.job] = event
+
+    def record(self, job, out):
+        if job.skipped:
+            return
+        m = job_metrics(job, out)
+        with self._lock:
+            self.live.pop(job, None)
+            self.jobs[m.codec, m.status] += 1
+            for key in ("media_s", "wall_s", "frames", "cpu_s", "bytes_in", "bytes_out"):
+                self.totals[key] += getattr(m, key)
+            self.peak_rss = max(self.peak_rss, m.peak_rss)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(m)) + "\n")
+            except OSError:
+                pass  # metrics are best effort; never fail an encode over them
+        return m
+
+    def prometheus(self):
+        """Totals and live gauges in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{PREFIX}_{name}{{{label}}} {value}" if label
+                             else f"{PREFIX}_{name} {value}")
+
+        with self._lock:
+            metric("jobs_total", "counter", "Finished jobs by codec and status.",
+                   [({"codec": c, "status": s}, n) for (c, s), n in sorted(self.jobs.items())])
+            for key, name, help_text in (
+                    ("media_s", "media_seconds_total", "Seconds of video encoded."),
+                    ("wall_s", "wall_seconds_total", "Wall time spent in finished jobs."),
+                    ("frames", "frames_total", "Frames encoded."),
+                    ("cpu_s", "cpu_seconds_total", "CPU time of ffmpeg processes."),
+                    ("bytes_in", "input_bytes_total", "Size of the inputs of finished jobs."),
+                    ("bytes_out", "output_bytes_total", "Size of the outputs written.")):
+                metric(name, "counter", help_text, [({}, self.totals[key])])
+            metric("peak_rss_bytes", "gauge", "Largest peak RSS of a single job.",
+                   [({}, self.peak_rss)])
+            live = list(self.live.values())
+        metric("jobs_running", "gauge", "Jobs encoding right now.", [({}, len(live))])
+        metric("encode_fps", "gauge", "Current frames per second over running jobs.",
+               [({}, sum(ev.fps for ev in live))])
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Starts a background HTTP server answering ``GET /metrics``."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,634 @@
+"""Tkinter front end; imported only when the GUI is actually shown."""
+import tkinter as tk
+from tkinter import filedialog, ttk, messagebox
+import queue
+import subprocess
+import threading
+from pathlib import Path
+import sys
+import shutil
+import os
+
+from admission import DEFAULT_RESERVE_MB
+from capabilities import default_capabilities
+from engine import (AUTO_CODECS, PRESETS, VIDEO_EXTENSIONS, BatchEncoder, EncodeSettings,
+                    apple_silicon, default_codec, recommend_settings)
+from preview import PREVIEW_HEIGHT, PREVIEW_WIDTH, PreviewSink
+from probe import default_cache
+from ladder import STREAMING_FORMATS, ladder_settings
+from profiles import ProfileStore, apply_changes, apply_profile, matching, parse_field
+from progress import EventBus
+from scan import Scanner, scan
+from scheduler import FAILED
+from telemetry import Telemetry
+
+
+class VideoCompressorApp(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title("Video Compressor")
+        # Increased height to accommodate the new button and better thumbnail display
+        self.geometry("520x880")
+
+        # --- Variables ---
+        self.resolution_var = tk.StringVar(value="640x360")
+        self.codec_var = tk.StringVar(value="")
+        self.crf_var = tk.IntVar(value=28)
+        self.preset_var = tk.StringVar(value="")
+        self.audio_bitrate_var = tk.StringVar(value="96k")
+        self.video_bitrate_var = tk.IntVar(value=0)
+        self.mono_var = tk.BooleanVar(value=False)
+        # Copy streams that already meet the settings instead of re-encoding
+        self.stream_copy_var = tk.BooleanVar(value=True)
+        self.trim_start_var = tk.StringVar(value="")
+        self.trim_end_var = tk.StringVar(value="")
+        # Output size budget in MB, 0 keeps the CRF/bitrate settings
+        self.target_size_var = tk.DoubleVar(value=0)
+        # Quality score the auto-tuned CRF must reach, 0 keeps the CRF as set
+        self.quality_target_var = tk.DoubleVar(value=0)
+        self.quality_metric_var = tk.StringVar(value="ssim")
+        # Rendition ladder replacing the resolution, empty for a single output
+        self.renditions_var = tk.StringVar(value="")
+        self.streaming_var = tk.StringVar(value="")
+        # "files" picks individual files, "folder" scans a directory
+        self.input_type_var = tk.StringVar(value="files")
+        self.recursive_var = tk.BooleanVar(value=True)
+        # Space-separated name globs a scanned file must match, empty for any
+        self.filter_var = tk.StringVar(value="")
+        # Number of concurrent encodes, 0 picks one from the CPU count
+        self.jobs_var = tk.IntVar(value=0)
+        # Segments to split long files into for parallel encoding, 0 = off
+        self.chunks_var = tk.IntVar(value=0)
+        # Skip files whose output is already up to date from an earlier run
+        self.skip_done_var = tk.BooleanVar(value=True)
+        # Free space (MB) to keep in the output directory, and the number of
+        # concurrent jobs per source disk (0 = no limit)
+        self.reserve_var = tk.IntVar(value=DEFAULT_RESERVE_MB)
+        self.per_device_var = tk.IntVar(value=0)
+
+        # EncodeSettings field -> the Tk variable editing it
+        self._setting_vars = {
+            'resolution': self.resolution_var, 'codec': self.codec_var,
+            'crf': self.crf_var, 'preset': self.preset_var,
+            'audio_bitrate': self.audio_bitrate_var, 'video_bitrate': self.video_bitrate_var,
+            'mono': self.mono_var, 'trim_start': self.trim_start_var,
+            'trim_end': self.trim_end_var, 'target_size': self.target_size_var,
+            'quality_target': self.quality_target_var,
+            'quality_metric': self.quality_metric_var, 'stream_copy': self.stream_copy_var,
+            'renditions': self.renditions_var, 'streaming': self.streaming_var,
+        }
+        self.profiles = ProfileStore()
+        self.profile_var = tk.StringVar(value="")
+        self.bulk_field_var = tk.StringVar(value="crf")
+        self.bulk_value_var = tk.StringVar(value="")
+        self.select_pattern_var = tk.StringVar(value="*")
+
+        self.inputs = []
+        # (st_dev, st_ino) of every listed file, to skip duplicates
+        self._seen = set()
+        # Background folder scan feeding the list, if one is running
+        self._scanner = None
+        # Path -> EncodeSettings; files with equal settings share one object
+        self.file_settings = {}
+        # FIX: Track which file's settings are currently displayed in the UI
+        self.currently_selected_path = None
+
+        # Scheduler for the running batch; owns the pause/cancel state
+        self.scheduler = None
+        # Progress from all running encodes; the UI renders it on a timer
+        self.events = EventBus()
+        self.events.subscribe(self._on_progress)
+        self._latest_event = None
+        # Preview frames tapped from the running encodes
+        self.preview = PreviewSink()
+        self._preview_seq = 0
+
+        self.outdir = None
+        self.probe_cache = default_cache()
+        # Per-job metrics, appended to metrics.jsonl in the cache directory
+        self.telemetry = Telemetry()
+
+        # detect Apple Silicon
+        self.hw = apple_silicon()
+        self.codec_var.set(default_codec(self.hw))
+        self.preset_var.set("slow")
+
+        self.create_widgets()
+
+        if not shutil.which("ffmpeg"):
+            messagebox.showwarning(
+                "FFmpeg Not Found", "FFmpeg executable not found. Please install or add to PATH.\nVisit https://ffmpeg.org/download.html")
+            self.compress_button.config(state="disabled")
+
+    def create_widgets(self):
+        # --- Input section ---
+        f1 = ttk.LabelFrame(self, text="Input Type")
+        f1.pack(fill="x", padx=10, pady=5)
+        ttk.Radiobutton(f1, text="Files",  variable=self.input_type_var,
+                        value="files").pack(side="left", padx=5)
+        ttk.Radiobutton(f1, text="Folder", variable=self.input_type_var,
+                        value="folder").pack(side="left", padx=5)
+        ttk.Checkbutton(f1, text="Subfolders", variable=self.recursive_var).pack(
+            side="left", padx=5)
+        ttk.Label(f1, text="Filter:").pack(side="left", padx=(5, 0))
+        ttk.Entry(f1, textvariable=self.filter_var, width=12).pack(side="left", padx=5)
+        ttk.Button(self, text="Select Input", command=self.select_input).pack(
+            fill="x", padx=10, pady=5)
+        ttk.Button(self, text="Clear List", command=self.clear_list).pack(
+            fill="x", padx=10, pady=(0, 5))
+        self.lbl_in = ttk.Label(self, text="No input selected")
+        self.lbl_in.pack(fill="x", padx=10)
+        ttk.Button(self, text="Select Output Directory",
+                   command=self.select_output).pack(fill="x", padx=10, pady=5)
+        self.lbl_out = ttk.Label(self, text="No output selected")
+        self.lbl_out.pack(fill="x", padx=10)
+
+        # file order list & reorder
+        self.listbox = tk.Listbox(self, height=5, selectmode=tk.EXTENDED)
+        self.listbox.pack(fill="x", padx=10, pady=(5, 0))
+        # load settings when a file is selected
+        self.listbox.bind('<<ListboxSelect>>', self.on_file_select)
+        btn_frame = ttk.Frame(self)
+        btn_frame.pack(fill="x", padx=10)
+        ttk.Button(btn_frame, text="Move Up",
+                   command=self.move_up).pack(side="left")
+        ttk.Button(btn_frame, text="Move Down",
+                   command=self.move_down).pack(side="left", padx=5)
+        # FIX: Added button to apply recommendations on demand
+        ttk.Button(btn_frame, text="Recommend Settings for Selected",
+                   command=self.apply_recommendations).pack(side="left", padx=5)
+
+        # --- Bulk edits over the selected files ---
+        bulk = ttk.LabelFrame(self, text="Selected files")
+        bulk.pack(fill="x", padx=10, pady=5)
+        ttk.Label(bulk, text="Profile:").grid(row=0, column=0, sticky="e", padx=5, pady=2)
+        self.profile_box = ttk.Combobox(bulk, textvariable=self.profile_var,
+                                        values=self.profiles.names(), width=14)
+        self.profile_box.grid(row=0, column=1, sticky="w", padx=5, pady=2)
+        ttk.Button(bulk, text="Apply", command=self.apply_profile).grid(
+            row=0, column=2, padx=2, pady=2)
+        ttk.Button(bulk, text="Save current", command=self.save_profile).grid(
+            row=0, column=3, padx=2, pady=2)
+        ttk.Label(bulk, text="Set:").grid(row=1, column=0, sticky="e", padx=5, pady=2)
+        ttk.OptionMenu(bulk, self.bulk_field_var, self.bulk_field_var.get(),
+                       *self._setting_vars).grid(row=1, column=1, sticky="w", padx=5, pady=2)
+        ttk.Entry(bulk, textvariable=self.bulk_value_var, width=10).grid(
+            row=1, column=2, sticky="w", padx=2, pady=2)
+        ttk.Button(bulk, text="Apply", command=self.apply_field).grid(
+            row=1, column=3, padx=2, pady=2)
+        ttk.Label(bulk, text="Select:").grid(row=2, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(bulk, textvariable=self.select_pattern_var, width=14).grid(
+            row=2, column=1, sticky="w", padx=5, pady=2)
+        ttk.Button(bulk, text="Select matching", command=self.select_matching).grid(
+            row=2, column=2, columnspan=2, padx=2, pady=2)
+
+        # --- Settings section ---
+        cfg = ttk.LabelFrame(self, text="Settings (for selected file)")
+        cfg.pack(fill="x", padx=10, pady=5)
+        # ... (rest of the settings widgets are unchanged) ...
+        ttk.Label(cfg, text="Resolution:").grid(
+            row=0, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.resolution_var, width=12).grid(
+            row=0, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Codec:").grid(
+            row=1, column=0, sticky="e", padx=5, pady=2)
+        codecs = [*AUTO_CODECS, "libx265", "libx264"]
+        if self.hw:
+            codecs += ["hevc_videotoolbox", "h264_videotoolbox"]
+        self.codec_menu = ttk.OptionMenu(cfg, self.codec_var, self.codec_var.get(), *codecs)
+        self.codec_menu.grid(row=1, column=1, sticky="w", padx=5, pady=2)
+        # Replace the guess above with what actually works once it's probed
+        threading.Thread(target=self._load_encoders, daemon=True).start()
+        ttk.Label(cfg, text="CRF:").grid(
+            row=2, column=0, sticky="e", padx=5, pady=2)
+        ttk.Spinbox(cfg, from_=0, to=51, textvariable=self.crf_var, width=5).grid(
+            row=2, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Preset:").grid(
+            row=3, column=0, sticky="e", padx=5, pady=2)
+        ttk.OptionMenu(cfg, self.preset_var, self.preset_var.get(
+        ), *PRESETS).grid(row=3, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Audio bitrate:").grid(
+            row=4, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.audio_bitrate_var, width=7).grid(
+            row=4, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Video bitrate (kbit/s):").grid(row=5,
+                                                            column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.video_bitrate_var, width=10).grid(
+            row=5, column=1, sticky="w", padx=5, pady=2)
+        ttk.Checkbutton(cfg, text="Mono audio", variable=self.mono_var).grid(
+            row=6, column=0, columnspan=2, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Trim Start (hh:mm:ss):").grid(
+            row=7, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.trim_start_var, width=12).grid(
+            row=7, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Trim End (hh:mm:ss):").grid(
+            row=8, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.trim_end_var, width=12).grid(
+            row=8, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Target size (MB, 0 = off):").grid(
+            row=9, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.target_size_var, width=10).grid(
+            row=9, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Auto CRF quality (0 = off):").grid(
+            row=10, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.quality_target_var, width=10).grid(
+            row=10, column=1, sticky="w", padx=5, pady=2)
+        ttk.OptionMenu(cfg, self.quality_metric_var, self.quality_metric_var.get(),
+                       "ssim", "vmaf", "psnr").grid(row=10, column=2, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Parallel jobs (0 = auto):").grid(
+            row=11, column=0, sticky="e", padx=5, pady=2)
+        ttk.Spinbox(cfg, from_=0, to=64, textvariable=self.jobs_var, width=5).grid(
+            row=11, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Split long files (segments, 0 = off):").grid(
+            row=12, column=0, sticky="e", padx=5, pady=2)
+        ttk.Spinbox(cfg, from_=0, to=32, textvariable=self.chunks_var, width=5).grid(
+            row=12, column=1, sticky="w", padx=5, pady=2)
+        ttk.Checkbutton(cfg, text="Copy streams that already fit",
+                        variable=self.stream_copy_var).grid(
+            row=13, column=0, columnspan=2, sticky="w", padx=5, pady=2)
+        ttk.Checkbutton(cfg, text="Skip up-to-date outputs", variable=self.skip_done_var).grid(
+            row=14, column=0, columnspan=2, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Keep free in output (MB):").grid(
+            row=15, column=0, sticky="e", padx=5, pady=2)
+        ttk.Spinbox(cfg, from_=0, to=1000000, increment=256, textvariable=self.reserve_var,
+                    width=8).grid(row=15, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Jobs per source disk (0 = any):").grid(
+            row=16, column=0, sticky="e", padx=5, pady=2)
+        ttk.Spinbox(cfg, from_=0, to=64, textvariable=self.per_device_var, width=5).grid(
+            row=16, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(cfg, text="Renditions (WxH[:kbit/s],...):").grid(
+            row=17, column=0, sticky="e", padx=5, pady=2)
+        ttk.Entry(cfg, textvariable=self.renditions_var, width=24).grid(
+            row=17, column=1, sticky="w", padx=5, pady=2)
+        ttk.OptionMenu(cfg, self.streaming_var, self.streaming_var.get(),
+                       "", *STREAMING_FORMATS).grid(row=17, column=2, sticky="w", padx=5, pady=2)
+
+        # --- Control buttons ---
+        self.compress_button = ttk.Button(
+            self, text="Compress", command=self.start_compression_thread)
+        self.compress_button.pack(fill="x", padx=10, pady=10)
+        btns2 = ttk.Frame(self)
+        btns2.pack(fill="x", padx=10, pady=(0, 10))
+        ttk.Button(btns2, text="Pause",
+                   command=self.pause).pack(side="left")
+        ttk.Button(btns2, text="Resume",  command=self.resume).pack(
+            side="left", padx=5)
+        ttk.Button(btns2, text="Cancel",  command=self.cancel).pack(
+            side="left", padx=5)
+        ttk.Button(btns2, text="Cancel Selected",
+                   command=self.cancel_selected).pack(side="left", padx=5)
+
+        # --- Progress section ---
+        self.overall_label = ttk.Label(self, text="Overall: 0/0 (0%)")
+        self.overall_label.pack(fill="x", padx=10)
+        self.overall_progress = ttk.Progressbar(
+            self, orient="horizontal", length=500, mode="determinate")
+        self.overall_progress.pack(fill="x", padx=10, pady=(0, 10))
+        self.file_label = ttk.Label(self, text="File: N/A (0%)")
+        self.file_label.pack(fill="x", padx=10)
+        self.file_progress = ttk.Progressbar(
+            self, orient="horizontal", length=500, mode="determinate")
+        self.file_progress.pack(fill="x", padx=10, pady=(0, 10))
+        self.eta_label = ttk.Label(self, text="ETA: N/A")
+        self.eta_label.pack(fill="x", padx=10)
+        self.open_btn = ttk.Button(
+            self, text="Open Output Folder", command=self.open_output, state="disabled")
+        self.open_btn.pack(fill="x", padx=10, pady=(5, 10))
+        # One photo image, rewritten in place for every preview frame
+        self.preview_photo = tk.PhotoImage(width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT)
+        self.thumb_label = ttk.Label(self, image=self.preview_photo)
+        self.thumb_label.pack(fill="both", expand=True, padx=10, pady=5)
+
+    def _load_encoders(self):
+        working = default_capabilities().working()
+        if working:
+            self.after(0, lambda: self.codec_menu.set_menu(
+                self.codec_var.get(), *AUTO_CODECS, *working))
+
+    def select_input(self):
+        if self.input_type_var.get() == "folder":
+            d = filedialog.askdirectory(title="Select folder of videos")
+            if not d:
+                return
+            if self._scanner:
+                self._scanner.cancel()
+            # Large trees are scanned in the background and listed as they're found
+            self._scanner = Scanner(
+                [d], recursive=self.recursive_var.get(), extensions=VIDEO_EXTENSIONS,
+                include=self.filter_var.get().split())
+            self._scanner.start()
+            self.lbl_in.config(text="Scanning...")
+            self.after(50, self._drain_scan, self._scanner)
+            return
+        fs = filedialog.askopenfilenames(
+            title="Select video files",
+            filetypes=[
+                ("Video files", " ".join("*" + e for e in VIDEO_EXTENSIONS)), ("All", "*.*")]
+        )
+        self._add_inputs(list(scan(fs)))
+
+    def _drain_scan(self, scanner):
+        if scanner is not self._scanner:
+            return  # superseded or cleared
+        while True:
+            try:
+                batch = scanner.batches.get_nowait()
+            except queue.Empty:
+                break
+            if batch is None:
+                self._scanner = None
+                self.lbl_in.config(text=f"{len(self.inputs)} file(s) selected")
+                return
+            self._add_inputs(batch)
+        self.after(50, self._drain_scan, scanner)
+
+    def _add_inputs(self, found):
+        """Appends ``(path, key)`` pairs from a scan, skipping files already listed."""
+        new_inputs = []
+        for p, key in found:
+            if key is None or key not in self._seen:
+                self._seen.add(key)
+                new_inputs.append(p)
+        if not new_inputs:
+            return
+        self.inputs.extend(new_inputs)
+        # FIX: Initialize settings for each newly added file based on current UI defaults
+        settings = self._settings_from_ui()
+        for p in new_inputs:
+            self.file_settings[p] = settings
+        self.listbox.insert(tk.END, *(p.name for p in new_inputs))
+        self.lbl_in.config(text=f"{len(self.inputs)} file(s) selected")
+        # Probe new files in the background so recommendations and encodes hit the cache
+        self.probe_cache.warm_later(new_inputs)
+
+    def select_output(self):
+        d = filedialog.askdirectory(title="Select output")
+        if d:
+            self.outdir = Path(d)
+            self.lbl_out.config(text=str(self.outdir))
+            self.open_btn.config(state="normal")
+
+    def apply_recommendations(self):
+        """Applies recommended settings to the currently selected file."""
+        if not self.listbox.curselection():
+            messagebox.showwarning(
+                "No Selection", "Please select a file from the list first.")
+            return
+        idx = self.listbox.curselection()[0]
+        selected_path = self.inputs[idx]
+        # This function updates the UI variables
+        self.recommend_settings(selected_path)
+        # After UI is updated, save them to the file's settings dictionary
+        self._save_current_settings()
+
+    def recommend_settings(self, fp: Path):
+        """Calculates recommended settings for a file and updates the UI."""
+        try:
+            info = self.probe_cache.get(fp)
+            rec = recommend_settings(info, self._settings_from_ui(), self.hw)
+
+            # Update UI variables with recommendations
+            self.resolution_var.set(rec.resolution)
+            self.codec_var.set(rec.codec)
+            self.preset_var.set(rec.preset)
+            self.audio_bitrate_var.set(rec.audio_bitrate)
+            self.video_bitrate_var.set(rec.video_bitrate)
+            self.crf_var.set(rec.crf)
+            self.mono_var.set(rec.mono)
+
+        except (OSError, subprocess.CalledProcessError, ValueError) as e:
+            messagebox.showerror(
+                "Error Reading Video Info", f"Failed to get video details for {fp.name}. It may be corrupt or have no video/audio stream.\n\nError: {e}")
+        except Exception as e:
+            messagebox.showerror(
+                "Recommendation Error", f"An unexpected error occurred while generating recommendations for {fp.name}: {e}")
+
+    def start_compression_thread(self):
+        # Save any pending changes for the selected file before the worker reads them
+        self._save_current_settings()
+        workers = self.jobs_var.get()
+        chunks = self.chunks_var.get()
+        resume = self.skip_done_var.get()
+        limits = (self.reserve_var.get(), self.per_device_var.get())
+        threading.Thread(target=self.compress_all, args=(workers, chunks, resume, limits),
+                         daemon=True).start()
+
+    def compress_all(self, workers=0, chunks=0, resume=True, limits=(DEFAULT_RESERVE_MB, 0)):
+        if not self.inputs or not self.outdir:
+            self.after(0, lambda: messagebox.showwarning(
+                "Missing", "Select input files and an output directory."))
+            return
+
+        total = len(self.inputs)
+        encoder = BatchEncoder(self.outdir, events=self.events,
+                               probe_cache=self.probe_cache, chunks=chunks, resume=resume,
+                               preview=self.preview, telemetry=self.telemetry,
+                               reserve_mb=limits[0], per_device=limits[1])
+        # Listbox order sets the queue priority
+        scheduler = encoder.start(
+            [(p, self.file_settings[p]) for p in self.inputs],
+            workers=workers)
+        self.scheduler = scheduler
+        self.after(0, lambda: (
+            self.overall_progress.config(maximum=100, value=0),
+            self.overall_label.config(text=f"Overall: 0/{total} (0%)"),
+            self._poll_progress()
+        ))
+        scheduler.join()
+
+        failed = [j for j in scheduler.jobs if j.state == FAILED]
+        if scheduler.cancel_event.is_set():
+            msg = "Compression cancelled."
+        elif failed:
+            names = "\n".join(f"{j.key.name}: {j.error}" for j in failed)
+            msg = f"Compression finished with {len(failed)} failure(s):\n\n{names}"
+        else:
+            msg = "Compression complete!"
+        skipped = sum(1 for j in scheduler.jobs if j.skipped)
+        if skipped and not scheduler.cancel_event.is_set():
+            msg += f"\n\n{skipped} file(s) were already up to date and skipped."
+        self.after(0, lambda: (self._show_progress(),
+                               messagebox.showinfo("Done", msg)))
+
+    def _on_progress(self, event):
+        """Bus subscriber; runs on reader threads so it only records the event."""
+        self._latest_event = event
+
+    def _show_preview(self):
+        # Hidden or iconified: let the sink drop frames without copying them
+        self.preview.active = bool(self.winfo_viewable())
+        if self.preview.active and self.preview.seq != self._preview_seq:
+            self._preview_seq = self.preview.seq
+            self.preview_photo.configure(data=self.preview.ppm(), format="PPM")
+
+    def _show_progress(self):
+        """Updates the file and overall bars from the latest progress events."""
+        ev = self._latest_event
+        if ev is not None:
+            speed = f" {ev.speed:.2f}x" if ev.speed else ""
+            self.file_progress.config(maximum=100, value=ev.percent)
+            self.file_label.config(
+                text=f"File: {ev.job.key.name} ({ev.percent:.1f}%) - {ev.job.data.describe()}{speed}")
+        if not self.scheduler:
+            return
+        done, total, eta = self.scheduler.progress()
+        finished, count = self.scheduler.counts()
+        pct = done / total * 100 if total > 0 else 0
+        running = len(self.scheduler.running())
+        self.overall_progress.config(value=pct)
+        self.overall_label.config(
+            text=f"Overall: {finished}/{count} ({pct:.1f}%) - {running} running")
+        self.eta_label.config(
+            text=f"ETA: {eta:.1f}s" if eta is not None else "ETA: N/A")
+
+    def _poll_progress(self):
+        # A single timer renders progress, however many jobs are reporting
+        self._show_progress()
+        self._show_preview()
+        if self.scheduler and self.scheduler.is_active():
+            self.after(250, self._poll_progress)
+
+    def pause(self):
+        if self.scheduler:
+            self.scheduler.pause_all()
+
+    def resume(self):
+        if self.scheduler:
+            self.scheduler.resume_all()
+
+    def cancel(self):
+        if self.scheduler:
+            self.scheduler.cancel_all()
+
+    def cancel_selected(self):
+        """Cancels only the selected file's job, leaving the rest of the batch running."""
+        if not self.scheduler or not self.listbox.curselection():
+            return
+        path = self.inputs[self.listbox.curselection()[0]]
+        for job in self.scheduler.jobs:
+            if job.key == path:
+                self.scheduler.cancel(job)
+
+    def _save_current_settings(self):
+        """Saves the current UI settings to the file tracked by currently_selected_path."""
+        if self.currently_selected_path and self.currently_selected_path in self.file_settings:
+            self.file_settings[self.currently_selected_path] = self._settings_from_ui()
+
+    def _settings_from_ui(self):
+        # A ladder ignores target size, auto CRF and stream copy; don't keep
+        # values that would look as if they applied
+        return ladder_settings(
+            EncodeSettings.from_dict({k: v.get() for k, v in self._setting_vars.items()}))
+
+    def _settings_to_ui(self, settings):
+        for name, var in self._setting_vars.items():
+            var.set(getattr(settings, name))
+
+    def _selected_paths(self):
+        return [self.inputs[i] for i in self.listbox.curselection()]
+
+    def _bulk_apply(self, apply):
+        """Runs ``apply(paths)`` on the selected files and refreshes the editor."""
+        self._save_current_settings()
+        paths = self._selected_paths()
+        if not paths:
+            messagebox.showwarning("No Selection", "Select files in the list first.")
+            return
+        apply(paths)
+        if self.currently_selected_path in self.file_settings:
+            self._settings_to_ui(self.file_settings[self.currently_selected_path])
+
+    def apply_profile(self):
+        try:
+            settings = self.profiles.get(self.profile_var.get())
+        except KeyError:
+            messagebox.showwarning("Unknown Profile", "Pick a saved profile first.")
+            return
+        self._bulk_apply(lambda paths: apply_profile(self.file_settings, paths, settings))
+
+    def save_profile(self):
+        name = self.profile_var.get().strip()
+        if not name:
+            messagebox.showwarning("No Name", "Type a name for the profile first.")
+            return
+        try:
+            self.profiles.save(name, self._settings_from_ui())
+        except OSError as e:
+            messagebox.showerror("Save Failed", f"Could not save profile: {e}")
+            return
+        self.profile_box.config(values=self.profiles.names())
+
+    def apply_field(self):
+        field = self.bulk_field_var.get()
+        try:
+            value = parse_field(field, self.bulk_value_var.get())
+        except ValueError as e:
+            messagebox.showerror("Invalid Value", f"{field}: {e}")
+            return
+        self._bulk_apply(lambda paths: apply_changes(self.file_settings, paths, **{field: value}))
+
+    def select_matching(self):
+        wanted = set(matching(self.inputs, self.select_pattern_var.get().strip() or "*"))
+        self.listbox.selection_clear(0, tk.END)
+        for i, p in enumerate(self.inputs):
+            if p in wanted:
+                self.listbox.selection_set(i)
+        self.listbox.event_generate("<<ListboxSelect>>")
+
+    def on_file_select(self, event):
+        # FIX: Save settings for the previously selected file before loading new ones
+        self._save_current_settings()
+        if not self.listbox.curselection():
+            self.currently_selected_path = None
+            return
+        idx = self.listbox.curselection()[0]
+        path = self.inputs[idx]
+        self.currently_selected_path = path  # Update the tracker
+        settings = self.file_settings.get(path)
+        if settings:
+            self._settings_to_ui(settings)
+
+    def move_up(self):
+        idx_tuple = self.listbox.curselection()
+        if not idx_tuple or idx_tuple[0] == 0:
+            return
+        i = idx_tuple[0]
+        self._swap_rows(i-1)
+        self.listbox.selection_set(i-1)
+        self.listbox.event_generate("<<ListboxSelect>>")
+
+    def move_down(self):
+        idx_tuple = self.listbox.curselection()
+        if not idx_tuple or idx_tuple[0] == len(self.inputs)-1:
+            return
+        i = idx_tuple[0]
+        self._swap_rows(i)
+        self.listbox.selection_set(i+1)
+        self.listbox.event_generate("<<ListboxSelect>>")
+
+    def _swap_rows(self, i):
+        """Swaps rows ``i`` and ``i + 1`` without redrawing the rest of the list."""
+        self.inputs[i], self.inputs[i+1] = self.inputs[i+1], self.inputs[i]
+        self.listbox.delete(i, i+1)
+        self.listbox.insert(i, self.inputs[i].name, self.inputs[i+1].name)
+
+    def clear_list(self):
+        self._save_current_settings()
+        if self._scanner:
+            self._scanner.cancel()
+            self._scanner = None
+        self.inputs.clear()
+        self._seen.clear()
+        self.file_settings.clear()
+        self.currently_selected_path = None
+        self.listbox.delete(0, tk.END)
+        self.lbl_in.config(text="No input selected")
+
+    def open_output(self):
+        if self.outdir and self.outdir.exists():
+            if sys.platform == "darwin":
+                subprocess.run(["open", str(self.outdir)])
+            elif sys.platform.startswith("win"):
+                os.startfile(str(self.outdir))
+            else:
+                subprocess.run(["xdg-open", str(self.outdir)])
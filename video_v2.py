@@ -1,460 +1,289 @@
 #!/usr/bin/env python3
-import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
-import subprocess
-import threading
-import re
-from pathlib import Path
-import platform
+"""Video Compressor entry point.
+
+Without arguments this opens the Tkinter GUI. With ``--headless`` it encodes
+from the command line using the same engine, without importing tkinter::
+
+    video_v2.py --headless in/ -o out/ --jobs 4 --codec libx264 --crf 26
+
+``--watch`` keeps encoding whatever is dropped into a folder::
+
+    video_v2.py --watch hot/ -o out/ --profile small --archive done/
+
+``--renditions`` writes several sizes per input from a single decode,
+optionally as an HLS or DASH stream::
+
+    video_v2.py --headless in/ -o out/ --renditions 1920x1080:5000,1280x720,640x360 --streaming hls
+
+Settings can be saved as named profiles and reused::
+
+    video_v2.py --codec libx264 --crf 26 --save-profile small
+    video_v2.py --headless --profile small in/ -o out/
+
+``--benchmark`` times a matrix of encoder settings instead::
+
+    video_v2.py --benchmark --bench-presets fast,slow --bench-metrics ssim
+"""
+import argparse
+import logging
 import sys
-import time
-import shutil
-import os
-import io
-from PIL import Image, ImageTk
-
-
-class VideoCompressorApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("Video Compressor")
-        # Increased height to accommodate the new button and better thumbnail display
-        self.geometry("520x680")
-
-        # --- Variables ---
-        self.resolution_var = tk.StringVar(value="640x360")
-        self.codec_var = tk.StringVar(value="")
-        self.crf_var = tk.IntVar(value=28)
-        self.preset_var = tk.StringVar(value="")
-        self.audio_bitrate_var = tk.StringVar(value="96k")
-        self.video_bitrate_var = tk.IntVar(value=0)
-        self.mono_var = tk.BooleanVar(value=False)
-        self.trim_start_var = tk.StringVar(value="")
-        self.trim_end_var = tk.StringVar(value="")
-        # Currently unused, but kept for future extension
-        self.input_type_var = tk.StringVar(value="files")
-
-        self.inputs = []
-        # FIX: Store individual file settings
-        self.file_settings = {}
-        # FIX: Track which file's settings are currently displayed in the UI
-        self.currently_selected_path = None
-
-        # Pause/Resume and Cancel flags
-        self.pause_event = threading.Event()
-        self.pause_event.set()
-        self.cancel_event = threading.Event()
-
-        self.outdir = None
-
-        # detect Apple Silicon
-        self.hw = (sys.platform ==
-                   "darwin" and platform.machine().startswith("arm"))
-        self.codec_var.set("hevc_videotoolbox" if self.hw else "libx265")
-        self.preset_var.set("slow")
-
-        self.create_widgets()
-
-        if not shutil.which("ffmpeg"):
-            messagebox.showwarning(
-                "FFmpeg Not Found", "FFmpeg executable not found. Please install or add to PATH.\nVisit https://ffmpeg.org/download.html")
-            self.compress_button.config(state="disabled")
-
-    def create_widgets(self):
-        # --- Input section ---
-        f1 = ttk.LabelFrame(self, text="Input Type")
-        f1.pack(fill="x", padx=10, pady=5)
-        ttk.Radiobutton(f1, text="Files",  variable=self.input_type_var,
-                        value="files").pack(side="left", padx=5)
-        ttk.Radiobutton(f1, text="Folder", variable=self.input_type_var,
-                        value="folder").pack(side="left", padx=5)
-        ttk.Button(self, text="Select Input Files", command=self.select_input).pack(
-            fill="x", padx=10, pady=5)
-        ttk.Button(self, text="Clear List", command=self.clear_list).pack(
-            fill="x", padx=10, pady=(0, 5))
-        self.lbl_in = ttk.Label(self, text="No input selected")
-        self.lbl_in.pack(fill="x", padx=10)
-        ttk.Button(self, text="Select Output Directory",
-                   command=self.select_output).pack(fill="x", padx=10, pady=5)
-        self.lbl_out = ttk.Label(self, text="No output selected")
-        self.lbl_out.pack(fill="x", padx=10)
-
-        # file order list & reorder
-        self.listbox = tk.Listbox(self, height=5)
-        self.listbox.pack(fill="x", padx=10, pady=(5, 0))
-        # load settings when a file is selected
-        self.listbox.bind('<<ListboxSelect>>', self.on_file_select)
-        btn_frame = ttk.Frame(self)
-        btn_frame.pack(fill="x", padx=10)
-        ttk.Button(btn_frame, text="Move Up",
-                   command=self.move_up).pack(side="left")
-        ttk.Button(btn_frame, text="Move Down",
-                   command=self.move_down).pack(side="left", padx=5)
-        # FIX: Added button to apply recommendations on demand
-        ttk.Button(btn_frame, text="Recommend Settings for Selected",
-                   command=self.apply_recommendations).pack(side="left", padx=5)
-
-        # --- Settings section ---
-        cfg = ttk.LabelFrame(self, text="Settings (for selected file)")
-        cfg.pack(fill="x", padx=10, pady=5)
-        # ... (rest of the settings widgets are unchanged) ...
-        ttk.Label(cfg, text="Resolution:").grid(
-            row=0, column=0, sticky="e", padx=5, pady=2)
-        ttk.Entry(cfg, textvariable=self.resolution_var, width=12).grid(
-            row=0, column=1, sticky="w", padx=5, pady=2)
-        ttk.Label(cfg, text="Codec:").grid(
-            row=1, column=0, sticky="e", padx=5, pady=2)
-        codecs = ["libx265", "libx264"]
-        if self.hw:
-            codecs += ["hevc_videotoolbox", "h264_videotoolbox"]
-        ttk.OptionMenu(cfg, self.codec_var, self.codec_var.get(),
-                       *codecs).grid(row=1, column=1, sticky="w", padx=5, pady=2)
-        ttk.Label(cfg, text="CRF:").grid(
-            row=2, column=0, sticky="e", padx=5, pady=2)
-        ttk.Spinbox(cfg, from_=0, to=51, textvariable=self.crf_var, width=5).grid(
-            row=2, column=1, sticky="w", padx=5, pady=2)
-        ttk.Label(cfg, text="Preset:").grid(
-            row=3, column=0, sticky="e", padx=5, pady=2)
-        presets = ["ultrafast", "fast", "medium", "slow", "slower", "veryslow"]
-        ttk.OptionMenu(cfg, self.preset_var, self.preset_var.get(
-        ), *presets).grid(row=3, column=1, sticky="w", padx=5, pady=2)
-        ttk.Label(cfg, text="Audio bitrate:").grid(
-            row=4, column=0, sticky="e", padx=5, pady=2)
-        ttk.Entry(cfg, textvariable=self.audio_bitrate_var, width=7).grid(
-            row=4, column=1, sticky="w", padx=5, pady=2)
-        ttk.Label(cfg, text="Video bitrate (kbit/s):").grid(row=5,
-                                                            column=0, sticky="e", padx=5, pady=2)
-        ttk.Entry(cfg, textvariable=self.video_bitrate_var, width=10).grid(
-            row=5, column=1, sticky="w", padx=5, pady=2)
-        ttk.Checkbutton(cfg, text="Mono audio", variable=self.mono_var).grid(
-            row=6, column=0, columnspan=2, sticky="w", padx=5, pady=2)
-        ttk.Label(cfg, text="Trim Start (hh:mm:ss):").grid(
-            row=7, column=0, sticky="e", padx=5, pady=2)
-        ttk.Entry(cfg, textvariable=self.trim_start_var, width=12).grid(
-            row=7, column=1, sticky="w", padx=5, pady=2)
-        ttk.Label(cfg, text="Trim End (hh:mm:ss):").grid(
-            row=8, column=0, sticky="e", padx=5, pady=2)
-        ttk.Entry(cfg, textvariable=self.trim_end_var, width=12).grid(
-            row=8, column=1, sticky="w", padx=5, pady=2)
-
-        # --- Control buttons ---
-        self.compress_button = ttk.Button(
-            self, text="Compress", command=self.start_compression_thread)
-        self.compress_button.pack(fill="x", padx=10, pady=10)
-        btns2 = ttk.Frame(self)
-        btns2.pack(fill="x", padx=10, pady=(0, 10))
-        ttk.Button(btns2, text="Pause",
-                   command=lambda: self.pause_event.clear()).pack(side="left")
-        ttk.Button(btns2, text="Resume",  command=self.pause_event.set).pack(
-            side="left", padx=5)
-        ttk.Button(btns2, text="Cancel",  command=lambda: self.cancel_event.set()).pack(
-            side="left", padx=5)
-
-        # --- Progress section ---
-        self.overall_label = ttk.Label(self, text="Overall: 0/0 (0%)")
-        self.overall_label.pack(fill="x", padx=10)
-        self.overall_progress = ttk.Progressbar(
-            self, orient="horizontal", length=500, mode="determinate")
-        self.overall_progress.pack(fill="x", padx=10, pady=(0, 10))
-        self.file_label = ttk.Label(self, text="File: N/A (0%)")
-        self.file_label.pack(fill="x", padx=10)
-        self.file_progress = ttk.Progressbar(
-            self, orient="horizontal", length=500, mode="determinate")
-        self.file_progress.pack(fill="x", padx=10, pady=(0, 10))
-        self.eta_label = ttk.Label(self, text="ETA: N/A")
-        self.eta_label.pack(fill="x", padx=10)
-        self.open_btn = ttk.Button(
-            self, text="Open Output Folder", command=self.open_output, state="disabled")
-        self.open_btn.pack(fill="x", padx=10, pady=(5, 10))
-        self.thumb_label = ttk.Label(self)
-        self.thumb_label.pack(fill="both", expand=True, padx=10, pady=5)
-
-    def select_input(self):
-        fs = filedialog.askopenfilenames(
-            title="Select video files",
-            filetypes=[
-                ("Video files", "*.mp4 *.mkv *.avi *.mov *.flv *.wmv"), ("All", "*.*")]
-        )
-        new_inputs = [Path(x) for x in fs if Path(x) not in self.inputs]
-        self.inputs.extend(new_inputs)
-        # FIX: Initialize settings for each newly added file based on current UI defaults
-        for p in new_inputs:
-            self.file_settings[p] = {
-                'resolution': self.resolution_var.get(), 'codec': self.codec_var.get(),
-                'crf': self.crf_var.get(), 'preset': self.preset_var.get(),
-                'audio_bitrate': self.audio_bitrate_var.get(), 'video_bitrate': self.video_bitrate_var.get(),
-                'mono': self.mono_var.get(), 'trim_start': self.trim_start_var.get(),
-                'trim_end': self.trim_end_var.get()
-            }
-        self.lbl_in.config(text=f"{len(self.inputs)} file(s) selected")
-        self.refresh_listbox()
-
-    def select_output(self):
-        d = filedialog.askdirectory(title="Select output")
-        if d:
-            self.outdir = Path(d)
-            self.lbl_out.config(text=str(self.outdir))
-            self.open_btn.config(state="normal")
-
-    def apply_recommendations(self):
-        """Applies recommended settings to the currently selected file."""
-        if not self.listbox.curselection():
-            messagebox.showwarning(
-                "No Selection", "Please select a file from the list first.")
-            return
-        idx = self.listbox.curselection()[0]
-        selected_path = self.inputs[idx]
-        # This function updates the UI variables
-        self.recommend_settings(selected_path)
-        # After UI is updated, save them to the file's settings dictionary
-        self._save_current_settings()
-
-    def recommend_settings(self, fp: Path):
-        """Calculates recommended settings for a file and updates the UI."""
+
+from admission import DEFAULT_RESERVE_MB
+from engine import (AUTO_CODECS, PRESETS, BatchEncoder, EncodeSettings, auto_family,
+                    collect_inputs, default_codec)
+from ladder import STREAMING_FORMATS, ladder_settings, parse_renditions
+from profiles import ProfileStore
+from progress import log_sink
+from scheduler import CANCELLED, FAILED
+from telemetry import Telemetry
+from watch import SETTLE_TIME, WatchFolder
+
+
+def __getattr__(name):
+    # Keep `from video_v2 import VideoCompressorApp` working without paying
+    # for tkinter on every import.
+    if name == "VideoCompressorApp":
+        from video_gui import VideoCompressorApp
+        return VideoCompressorApp
+    raise AttributeError(name)
+
+
+def _renditions(text):
+    try:
+        if text:
+            parse_renditions(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return text
+
+
+def build_parser():
+    defaults = EncodeSettings()
+    p = argparse.ArgumentParser(description="Batch video compressor.")
+    p.add_argument("--headless", action="store_true",
+                   help="encode from the command line instead of opening the GUI")
+    p.add_argument("inputs", nargs="*", help="input files or directories")
+    p.add_argument("--watch", metavar="DIR",
+                   help="keep encoding videos dropped into DIR until interrupted")
+    p.add_argument("--archive", metavar="DIR",
+                   help="where --watch moves finished inputs (default: DIR/archive)")
+    p.add_argument("--settle", type=float, default=SETTLE_TIME, metavar="SECONDS",
+                   help="--watch waits until a file is unchanged this long (default: %(default)s)")
+    p.add_argument("-o", "--outdir", help="output directory")
+    p.add_argument("-r", "--recursive", action="store_true",
+                   help="also take videos from subdirectories of input directories")
+    p.add_argument("--include", action="append", default=[], metavar="GLOB",
+                   help="only take files matching this name pattern from directories")
+    p.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                   help="skip files matching this name pattern in directories")
+    p.add_argument("-j", "--jobs", type=int, default=0,
+                   help="concurrent encodes (default: auto from CPU count)")
+    p.add_argument("--profile", metavar="NAME",
+                   help="start from a saved settings profile; other options override it")
+    p.add_argument("--save-profile", metavar="NAME",
+                   help="save the resulting settings as a profile")
+    p.add_argument("--resolution", default=defaults.resolution)
+    p.add_argument("--renditions", type=_renditions, default="", metavar="LIST",
+                   help="encode a ladder such as 1920x1080:5000,1280x720:2800,640x360 "
+                        "(WxH[:kbit/s]) from one decode instead of --resolution")
+    p.add_argument("--streaming", default="", choices=STREAMING_FORMATS,
+                   help="write the --renditions ladder as HLS or DASH segments and a manifest")
+    p.add_argument("--codec", default=default_codec(),
+                   help='ffmpeg video encoder, "auto" for the fastest HEVC one that works here, '
+                        'or auto-hevc/auto-h264/auto-av1')
+    p.add_argument("--list-encoders", action="store_true",
+                   help="re-probe the usable encoders and their speed, then exit")
+    p.add_argument("--crf", type=int, default=defaults.crf)
+    p.add_argument("--preset", default=defaults.preset, choices=PRESETS)
+    p.add_argument("--audio-bitrate", default=defaults.audio_bitrate)
+    p.add_argument("--video-bitrate", type=int, default=defaults.video_bitrate,
+                   help="kbit/s; 0 uses CRF")
+    p.add_argument("--mono", action="store_true")
+    p.add_argument("--no-copy", dest="stream_copy", action="store_false",
+                   help="always re-encode, even streams that already meet the settings")
+    p.add_argument("--trim-start", default="", metavar="HH:MM:SS")
+    p.add_argument("--trim-end", default="", metavar="HH:MM:SS")
+    p.add_argument("--target-size", type=float, default=0, metavar="MB",
+                   help="encode to this output size (two-pass for x264/x265)")
+    p.add_argument("--quality-target", type=float, default=0, metavar="SCORE",
+                   help="auto-tune CRF per file to the cheapest that meets this score")
+    p.add_argument("--quality-metric", default="ssim", choices=["ssim", "vmaf", "psnr"])
+    p.add_argument("--chunks", type=int, default=0, metavar="N",
+                   help="split long files into N segments encoded in parallel")
+    p.add_argument("--force", action="store_true",
+                   help="re-encode even if the journal shows an output is up to date")
+    p.add_argument("--reserve", type=float, default=DEFAULT_RESERVE_MB, metavar="MB",
+                   help="hold jobs back while their output would leave less free space "
+                        "than this in the output directory (default: %(default)s)")
+    p.add_argument("--per-device", type=int, default=0, metavar="N",
+                   help="at most N concurrent jobs reading from the same disk (default: no limit)")
+    p.add_argument("--metrics-log", metavar="PATH",
+                   help="append per-job metrics as JSON lines here "
+                        "(default: metrics.jsonl in the cache directory)")
+    p.add_argument("--metrics-port", type=int, default=0, metavar="PORT",
+                   help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    p.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+
+    b = p.add_argument_group("benchmark", "compare encoder settings on sample clips "
+                             "(the inputs, or a generated test clip)")
+    b.add_argument("--benchmark", action="store_true", help="run the benchmark matrix")
+    b.add_argument("--bench-codecs", default="libx264,libx265", metavar="LIST")
+    b.add_argument("--bench-presets", default="fast,medium,slow", metavar="LIST")
+    b.add_argument("--bench-crf", default="23,28", metavar="LIST")
+    b.add_argument("--bench-bitrates", default="", metavar="LIST", help="kbit/s values")
+    b.add_argument("--bench-resolutions", default="640x360", metavar="LIST")
+    b.add_argument("--bench-metrics", default="", metavar="LIST",
+                   help="any of ssim,psnr,vmaf")
+    b.add_argument("--bench-duration", type=float, default=10,
+                   help="seconds of generated test clip")
+    b.add_argument("--bench-report", default="benchmark.csv",
+                   help="results file, .csv or .json")
+    return p
+
+
+def settings_from_args(args):
+    return ladder_settings(EncodeSettings.from_dict(dict(
+        resolution=args.resolution, codec=args.codec, crf=args.crf,
+        preset=args.preset, audio_bitrate=args.audio_bitrate,
+        video_bitrate=args.video_bitrate, mono=args.mono,
+        trim_start=args.trim_start, trim_end=args.trim_end,
+        target_size=args.target_size, quality_target=args.quality_target,
+        quality_metric=args.quality_metric, stream_copy=args.stream_copy,
+        renditions=args.renditions, streaming=args.streaming)))
+
+
+def run_headless(args):
+    inputs = collect_inputs(args.inputs, args.recursive, args.include, args.exclude)
+    if not inputs or not args.outdir:
+        print("error: --headless needs input files and -o/--outdir", file=sys.stderr)
+        return 2
+    settings = settings_from_args(args)
+    telemetry = Telemetry(args.metrics_log)
+    if args.metrics_port:
+        telemetry.serve(args.metrics_port)
+    encoder = BatchEncoder(args.outdir, chunks=args.chunks, resume=not args.force,
+                           telemetry=telemetry, reserve_mb=args.reserve,
+                           per_device=args.per_device)
+    if not args.quiet:
+        encoder.events.subscribe(log_sink(interval=2.0))
+    scheduler = encoder.start([(p, settings) for p in inputs], workers=args.jobs)
+    try:
+        scheduler.join()
+    except KeyboardInterrupt:
+        scheduler.cancel_all()
+        scheduler.join()
+        return 130
+    failed = [j for j in scheduler.jobs if j.state == FAILED]
+    for j in failed:
+        print(f"failed: {j.key}: {j.error}", file=sys.stderr)
+    cancelled = sum(1 for j in scheduler.jobs if j.state == CANCELLED)
+    skipped = sum(1 for j in scheduler.jobs if j.skipped)
+    done = len(scheduler.jobs) - len(failed) - cancelled - skipped
+    if not args.quiet:
+        print(f"{done}/{len(scheduler.jobs)} encoded, {skipped} up to date, "
+              f"{len(failed)} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def run_watch(args):
+    if not args.outdir:
+        print("error: --watch needs -o/--outdir", file=sys.stderr)
+        return 2
+    telemetry = Telemetry(args.metrics_log)
+    if args.metrics_port:
+        telemetry.serve(args.metrics_port)
+    encoder = BatchEncoder(args.outdir, chunks=args.chunks, resume=not args.force,
+                           telemetry=telemetry, reserve_mb=args.reserve,
+                           per_device=args.per_device)
+    if not args.quiet:
+        encoder.events.subscribe(log_sink(interval=2.0))
+    watcher = WatchFolder(encoder, args.watch, settings_from_args(args),
+                          archive=args.archive, workers=args.jobs, settle=args.settle)
+    print(f"watching {args.watch}, Ctrl+C to stop", file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+def _split(value, type=str):
+    return [type(x) for x in value.split(",") if x.strip()]
+
+
+def run_benchmark(args):
+    from benchmark import matrix, run_benchmark
+
+    def show(row):
+        if row.get("error"):
+            print(f"{row['codec']} {row['preset']}: error: {row['error']}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"{row['codec']:>18} {row['preset']:>9} {row['resolution']:>9} "
+                  f"crf={row['crf'] or '-':>2} br={row['video_bitrate'] or '-':>5} "
+                  f"{row['encode_fps']:>7} fps {row['wall_s']:>8}s "
+                  f"{row['output_bytes'] / 2**20:8.2f} MB", file=sys.stderr)
+
+    settings = matrix(_split(args.bench_codecs), _split(args.bench_presets),
+                      _split(args.bench_crf, int), _split(args.bench_bitrates, int),
+                      _split(args.bench_resolutions))
+    clips = collect_inputs(args.inputs, args.recursive, args.include, args.exclude)
+    rows = run_benchmark(settings, clips, _split(args.bench_metrics),
+                         report=args.bench_report, clip_duration=args.bench_duration,
+                         on_result=show)
+    print(f"{len(rows)} runs written to {args.bench_report}", file=sys.stderr)
+    return 1 if any(r.get("error") for r in rows) else 0
+
+
+def list_encoders():
+    from capabilities import default_capabilities
+    caps = default_capabilities().load(refresh=True)
+    print("hwaccels: " + (", ".join(caps["hwaccels"]) or "none"))
+    for codec, result in caps["encoders"].items():
+        status = f"{result['fps']:8.1f} fps" if result["ok"] else f"failed: {result['error']}"
+        print(f"{codec:>18} {status}")
+    best = default_capabilities().best_encoder()
+    for codec in AUTO_CODECS:
+        pick = default_capabilities().best_encoder([auto_family(codec)])
+        print(f"{codec}: {pick or 'none'}")
+    return 0 if best else 1
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile:
+        store = ProfileStore()
         try:
-            dur = float(subprocess.check_output([
-                "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1", str(fp)
-            ], text=True))
-            wh_str = subprocess.check_output([
-                "ffprobe", "-v", "error", "-select_streams", "v:0",
-                "-show_entries", "stream=width,height", "-of", "csv=p=0", str(
-                    fp)
-            ], text=True).strip()
-            w, h = map(int, wh_str.split(','))
-            ts = 350 * 1024 * 1024  # Target size in bytes (~350MB)
-            ch_str = subprocess.check_output([
-                "ffprobe", "-v", "error", "-select_streams", "a:0",
-                "-show_entries", "stream=channels", "-of", "default=noprint_wrappers=1:nokey=1", str(
-                    fp)
-            ], text=True).strip()
-            ch = int(ch_str) if ch_str else 1
-
-            # Recommend audio bitrate based on channels
-            rec_ab = 96 if ch == 1 else 128
-            self.audio_bitrate_var.set(f"{rec_ab}k")
-            ab_bits = rec_ab * 1000
-            total_bitrate = ts * 8 / dur
-            vk = int(max(total_bitrate - ab_bits, 100000) / 1000)
-
-            # Update UI variables with recommendations
-            self.resolution_var.set(f"{w}x{h}")
-            self.codec_var.set("hevc_videotoolbox" if self.hw else "libx265")
-            self.preset_var.set("slow")
-            self.video_bitrate_var.set(vk)
-            self.crf_var.set(28)  # Reset CRF as bitrate is now primary
-            self.mono_var.set(ch == 1)
-
-        except (subprocess.CalledProcessError, ValueError) as e:
-            messagebox.showerror(
-                "Error Reading Video Info", f"Failed to get video details for {fp.name}. It may be corrupt or have no video/audio stream.\n\nError: {e}")
-        except Exception as e:
-            messagebox.showerror(
-                "Recommendation Error", f"An unexpected error occurred while generating recommendations for {fp.name}: {e}")
-
-    def start_compression_thread(self):
-        threading.Thread(target=self.compress_all, daemon=True).start()
-
-    def compress_all(self):
-        # FIX: Save any pending changes for the last selected file before starting
-        self.after(0, self._save_current_settings)
-
-        if not self.inputs or not self.outdir:
-            self.after(0, lambda: messagebox.showwarning(
-                "Missing", "Select input files and an output directory."))
-            return
-
-        total = len(self.inputs)
-        last_thumb_time = 0
-        thumb_interval = 1 / 0.03
-        self.after(0, lambda: (
-            self.overall_progress.config(maximum=total, value=0),
-            self.overall_label.config(text=f"Overall: 0/{total} (0%)")
-        ))
-
-        for idx, inp in enumerate(self.inputs, start=1):
-            if self.cancel_event.is_set():
-                break
-
-            # --- FIX: GET PER-FILE SETTINGS ---
-            settings = self.file_settings[inp]
-            start_time = time.time()
-            try:
-                dur = float(subprocess.check_output([
-                    "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                    "-of", "default=noprint_wrappers=1:nokey=1", str(inp)
-                ], text=True))
-            except (subprocess.CalledProcessError, ValueError):
-                dur = 1  # Avoid division by zero for unreadable files
-
-            # FIX: Update file label with correct per-file settings
-            self.after(0, lambda d=dur, name=inp.name, s=settings: (
-                self.file_progress.config(maximum=d, value=0),
-                self.file_label.config(text=(
-                    f"File: {name} (0%) - Res: {s['resolution']} | Codec: {s['codec']} | "
-                    f"{'Bitrate: '+str(s['video_bitrate'])+'k' if s['video_bitrate'] > 0 else 'CRF: '+str(s['crf'])} | "
-                    f"Audio: {s['audio_bitrate']}"
-                ))
-            ))
-
-            stem = inp.stem + "_mobile"
-            out = self.outdir / f"{stem}.mp4"
-
-            # --- FIX: Build command using per-file settings from the dictionary ---
-            cmd = ["ffmpeg", "-y"]
-            if settings['trim_start']:
-                cmd += ["-ss", settings['trim_start']]
-            if "videotoolbox" in settings['codec']:
-                cmd += ["-hwaccel", "videotoolbox"]
-            cmd += ["-i", str(inp)]
-            if settings['trim_end']:
-                cmd += ["-to", settings['trim_end']]
-            cmd += [
-                "-c:v", settings['codec'], "-preset", settings['preset'],
-                "-vf", f"scale={settings['resolution']}", "-pix_fmt", "yuv420p",
-            ]
-            if settings['mono']:
-                cmd += ["-ac", "1"]
-            if settings['video_bitrate'] > 0:
-                cmd += ["-b:v", f"{settings['video_bitrate']}k"]
-            else:
-                cmd += ["-crf", str(settings['crf'])]
-            cmd += ["-c:a", "aac", "-b:a", settings['audio_bitrate'], str(out)]
-
-            proc = subprocess.Popen(
-                cmd, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
-            for line in proc.stderr:
-                while not self.pause_event.is_set():
-                    time.sleep(0.1)
-                if self.cancel_event.is_set():
-                    break
-
-                m = re.search(r"time=(\d+):(\d+):(\d+\.\d+)", line)
-                if m:
-                    h, mn, s = map(float, m.groups())
-                    secs = h*3600 + mn*60 + s
-                    pct_file = (secs / dur * 100) if dur > 0 else 0
-                    elapsed = time.time() - start_time
-                    eta = (elapsed / secs) * \
-                        (dur - secs) if secs > 1 else dur - secs
-                    eta = max(eta, 0)
-                    # FIX: Update progress label with per-file settings
-                    self.after(0, lambda p=pct_file, sc=secs, n=inp.name, e=eta, st=settings: (
-                        self.file_progress.config(value=sc),
-                        self.file_label.config(text=(
-                            f"File: {n} ({p:.1f}%) - Res: {st['resolution']} | Codec: {st['codec']} | "
-                            f"{'Bitrate: '+str(st['video_bitrate'])+'k' if st['video_bitrate'] > 0 else 'CRF: '+str(st['crf'])} | "
-                            f"Audio: {st['audio_bitrate']}"
-                        )),
-                        self.eta_label.config(text=f"ETA: {e:.1f}s")
-                    ))
-                    if time.time() - last_thumb_time >= thumb_interval:
-                        thumb_cmd = ["ffmpeg", "-ss", str(secs), "-i", str(inp), "-frames:v", "1",
-                                     "-vf", "scale=240:-1", "-f", "image2pipe", "pipe:1"]
-                        thumb_proc = subprocess.Popen(
-                            thumb_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
-                        thumb_data = thumb_proc.stdout.read()
-                        thumb_proc.wait()
-                        if thumb_data:
-                            try:
-                                img = Image.open(io.BytesIO(thumb_data))
-                                photo = ImageTk.PhotoImage(img)
-                                self.after(0, lambda p=photo: (
-                                    self.thumb_label.config(image=p), setattr(self, 'current_thumb', p)))
-                            except Exception:
-                                pass
-                        last_thumb_time = time.time()
-            proc.wait()
-            if self.cancel_event.is_set():
-                break
-
-            pct_overall = idx / total * 100
-            self.after(0, lambda i=idx, pct=pct_overall: (
-                self.overall_progress.config(value=i),
-                self.overall_label.config(
-                    text=f"Overall: {i}/{total} ({pct:.1f}%)")
-            ))
-
-        msg = "Compression cancelled." if self.cancel_event.is_set() else "Compression complete!"
-        self.after(0, lambda: messagebox.showinfo("Done", msg))
-        self.cancel_event.clear()
-        self.pause_event.set()
-
-    def _save_current_settings(self):
-        """Saves the current UI settings to the file tracked by currently_selected_path."""
-        if self.currently_selected_path and self.currently_selected_path in self.file_settings:
-            self.file_settings[self.currently_selected_path] = {
-                'resolution': self.resolution_var.get(), 'codec': self.codec_var.get(),
-                'crf': self.crf_var.get(), 'preset': self.preset_var.get(),
-                'audio_bitrate': self.audio_bitrate_var.get(), 'video_bitrate': self.video_bitrate_var.get(),
-                'mono': self.mono_var.get(), 'trim_start': self.trim_start_var.get(),
-                'trim_end': self.trim_end_var.get()
-            }
-
-    def on_file_select(self, event):
-        # FIX: Save settings for the previously selected file before loading new ones
-        self._save_current_settings()
-        if not self.listbox.curselection():
-            self.currently_selected_path = None
-            return
-        idx = self.listbox.curselection()[0]
-        path = self.inputs[idx]
-        self.currently_selected_path = path  # Update the tracker
-        settings = self.file_settings.get(path)
-        if settings:
-            self.resolution_var.set(settings['resolution'])
-            self.codec_var.set(settings['codec'])
-            self.crf_var.set(settings['crf'])
-            self.preset_var.set(settings['preset'])
-            self.audio_bitrate_var.set(settings['audio_bitrate'])
-            self.video_bitrate_var.set(settings['video_bitrate'])
-            self.mono_var.set(settings['mono'])
-            self.trim_start_var.set(settings['trim_start'])
-            self.trim_end_var.set(settings['trim_end'])
-
-    def move_up(self):
-        idx_tuple = self.listbox.curselection()
-        if not idx_tuple or idx_tuple[0] == 0:
-            return
-        i = idx_tuple[0]
-        self.inputs[i], self.inputs[i-1] = self.inputs[i-1], self.inputs[i]
-        self.refresh_listbox()
-        self.listbox.selection_set(i-1)
-        self.listbox.event_generate("<<ListboxSelect>>")
-
-    def move_down(self):
-        idx_tuple = self.listbox.curselection()
-        if not idx_tuple or idx_tuple[0] == len(self.inputs)-1:
-            return
-        i = idx_tuple[0]
-        self.inputs[i], self.inputs[i+1] = self.inputs[i+1], self.inputs[i]
-        self.refresh_listbox()
-        self.listbox.selection_set(i+1)
-        self.listbox.event_generate("<<ListboxSelect>>")
-
-    def refresh_listbox(self):
-        self.listbox.delete(0, tk.END)
-        for p in self.inputs:
-            self.listbox.insert(tk.END, p.name)
-
-    def clear_list(self):
-        self._save_current_settings()
-        self.inputs.clear()
-        self.file_settings.clear()
-        self.currently_selected_path = None
-        self.listbox.delete(0, tk.END)
-        self.lbl_in.config(text="No input selected")
-
-    def open_output(self):
-        if self.outdir and self.outdir.exists():
-            if sys.platform == "darwin":
-                subprocess.run(["open", str(self.outdir)])
-            elif sys.platform.startswith("win"):
-                os.startfile(str(self.outdir))
-            else:
-                subprocess.run(["xdg-open", str(self.outdir)])
+            profile = store.get(args.profile)
+        except KeyError:
+            parser.error(f"no profile named {args.profile!r} "
+                         f"(saved: {', '.join(store.names()) or 'none'})")
+        # Options given explicitly still override the profile's values
+        parser.set_defaults(**profile.to_dict())
+        args = parser.parse_args(argv)
+    if args.renditions and (args.target_size > 0 or args.quality_target > 0):
+        parser.error("--renditions can't be combined with --target-size or --quality-target")
+    if args.save_profile:
+        ProfileStore().save(args.save_profile, settings_from_args(args))
+        print(f"saved profile {args.save_profile!r}", file=sys.stderr)
+        if not args.headless:
+            return 0
+    if args.list_encoders:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        return list_encoders()
+    if args.benchmark:
+        return run_benchmark(args)
+    if args.watch:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        return run_watch(args)
+    if args.headless:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        return run_headless(args)
+    from video_gui import VideoCompressorApp
+    app = VideoCompressorApp()
+    app.mainloop()
+    return 0
 
 
 if __name__ == "__main__":
-    app = VideoCompressorApp()
-    app.mainloop()
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Watch-folder mode: encode videos as they are dropped into a directory.
+
+The folder is polled with ``os.scandir`` (portable, and cheap at a few
+seconds' interval). A file is queued once its size and mtime have stayed
+the same for ``settle`` seconds, so files still being copied in are left
+alone. Each finished input is moved to the archive directory, failed ones
+to ``failed/`` inside it, which keeps the folder, and the watcher's own
+state, down to what is still waiting. The encoder's scheduler forgets
+finished jobs, so memory stays flat however long the watch runs.
+"""
+import collections
+import itertools
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from engine import VIDEO_EXTENSIONS, log
+from scheduler import DONE, FAILED, auto_workers
+
+POLL_INTERVAL = 5.0
+SETTLE_TIME = 10.0
+# How many inputs that couldn't be moved out are remembered, so they
+# aren't encoded again
+MAX_UNARCHIVED = 1000
+
+
+def _unique(path):
+    """``path``, or ``name (n).ext`` if that is already taken."""
+    for n in itertools.count(1):
+        if not path.exists():
+            return path
+        path = path.with_name(f"{path.stem.rsplit(' (', 1)[0]} ({n}){path.suffix}")
+
+
+class WatchFolder:
+    def __init__(self, encoder, folder, settings, archive=None, workers=0,
+                 poll=POLL_INTERVAL, settle=SETTLE_TIME):
+        self.encoder = encoder
+        self.folder = Path(folder)
+        self.settings = encoder.resolve_codec(settings)
+        self.archive = Path(archive) if archive else self.folder / "archive"
+        self.workers = workers or auto_workers([self.settings.codec])
+        self.poll = poll
+        self.settle = settle
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # path -> (size, mtime_ns, time it was first seen like that)
+        self._pending = {}
+        # Files queued or encoding
+        self._active = set()
+        # Finished files that couldn't be moved -> (size, mtime_ns) they had
+        self._unarchived = collections.OrderedDict()
+        self._seq = itertools.count()
+
+    def scan(self, now=None):
+        """Paths in the folder that have stopped changing and aren't queued yet."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        present = set()
+        with os.scandir(self.folder) as it:
+            for e in it:
+                if e.name.startswith(".") or not e.name.lower().endswith(VIDEO_EXTENSIONS):
+                    continue
+                try:
+                    if not e.is_file():
+                        continue
+                    st = e.stat()
+                except OSError:
+                    continue  # vanished between listing and stat
+                path = Path(e.path)
+                present.add(path)
+                state = (st.st_size, st.st_mtime_ns)
+                with self._lock:
+                    if path in self._active:
+                        continue
+                    # Left behind by a failed move; a changed file is new work
+                    if self._unarchived.get(path) == state:
+                        continue
+                    self._unarchived.pop(path, None)
+                seen = self._pending.get(path)
+                if seen is None or seen[:2] != state:
+                    self._pending[path] = (*state, now)
+                elif st.st_size > 0 and now - seen[2] >= self.settle:
+                    ready.append(path)
+        # Forget files that were removed before they settled
+        for path in self._pending.keys() - present:
+            del self._pending[path]
+        with self._lock:
+            for path in self._unarchived.keys() - present:
+                del self._unarchived[path]
+        return ready
+
+    def _queue(self, path):
+        del self._pending[path]
+        with self._lock:
+            self._active.add(path)
+        # Sequential priorities keep the queue first-in, first-out
+        self.encoder.submit(path, self.settings, next(self._seq))
+
+    def _finished(self, job):
+        """Moves the input out of the watched folder once its job is over."""
+        path = job.key
+        try:
+            if job.state == DONE:
+                dest = self.archive
+            elif job.state == FAILED:
+                dest = self.archive / "failed"
+            else:
+                return  # cancelled: leave it to be picked up next time
+            dest.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(path), str(_unique(dest / path.name)))
+        except OSError as e:
+            log.warning("%s: could not archive, leaving it in place: %s", path.name, e)
+            try:
+                st = path.stat()
+            except OSError:
+                return  # gone anyway
+            # Keep its journal record too, so the encoder still skips it
+            # once it has dropped out of this bounded set
+            with self._lock:
+                self._unarchived[path] = (st.st_size, st.st_mtime_ns)
+                while len(self._unarchived) > MAX_UNARCHIVED:
+                    self._unarchived.popitem(last=False)
+        else:
+            # The archived input's journal record is no longer needed in memory
+            self.encoder.journal.forget(job.output)
+        finally:
+            with self._lock:
+                self._active.discard(path)
+
+    def run(self):
+        """Watches until ``stop_event`` is set (or KeyboardInterrupt), then
+        cancels whatever is still queued or running."""
+        scheduler = self.encoder.open(self.workers, on_finish=self._finished)
+        try:
+            while not self.stop_event.is_set():
+                for path in self.scan():
+                    self._queue(path)
+                self.stop_event.wait(self.poll)
+        finally:
+            scheduler.cancel_all()
+            scheduler.close()
+            scheduler.join()